@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.account.models import Account, VerifyPhoneNumber, Country, SportClub, SMSToken, City
+from apps.account.models import Account, VerifyPhoneNumber, Country, SportClub, SMSToken, City, OneTimeCode
 
 
 class CityInline(admin.TabularInline):
@@ -19,8 +19,15 @@ class AccountAdmin(admin.ModelAdmin):
     readonly_fields = ('date_login', 'date_created')
 
 
+class OneTimeCodeAdmin(admin.ModelAdmin):
+    list_display = ('phone_number', 'attempts', 'expires_at')
+    search_fields = ('phone_number',)
+    readonly_fields = ('phone_number', 'code', 'attempts', 'expires_at')
+
+
 admin.site.register(Account, AccountAdmin)
 admin.site.register(VerifyPhoneNumber)
 admin.site.register(SportClub)
 admin.site.register(SMSToken)
 admin.site.register(Country, CountryAdmin)
+admin.site.register(OneTimeCode, OneTimeCodeAdmin)
@@ -0,0 +1,79 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.account.api.v1.blacklist import is_revoked
+
+TOKEN_VERSION_CLAIM = 'ver'
+
+_users = {}
+_lock = threading.Lock()
+
+
+def invalidate_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+
+def _cache_user(user):
+    with _lock:
+        if len(_users) >= settings.JWT_USER_CACHE_SIZE:
+            _users.pop(next(iter(_users)))
+        _users[user.pk] = (time.monotonic() + settings.JWT_USER_CACHE_TTL, user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the account from a short-lived per-worker
+    cache instead of querying it on every request. Entries are keyed by user id
+    and only served while the token's version claim matches the account's
+    token_version, a mismatch is checked against the database before the token
+    is refused; account saves drop the entry (see apps.account.signals).
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # access tokens revoked on logout; the bloom filter keeps this off SQL for everyone else
+        if is_revoked(validated_token[api_settings.JTI_CLAIM]):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def _fetch_user(self, user_id):
+        try:
+            user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        _cache_user(user)
+        return user
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+        cached = _users.get(user_id)
+        user = cached[1] if cached and cached[0] > time.monotonic() else None
+        if user is None or user.token_version != version:
+            # a stale entry (e.g. a password change made by another worker) is refetched once
+            user = self._fetch_user(user_id)
+
+        if user.token_version != version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        # every request gets its own instance, views may modify and save it
+        return copy.copy(user)
@@ -0,0 +1,170 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+SEQUENCE_KEY = 'token_blacklist:sequence'
+GENERATION_KEY = 'token_blacklist:generation'
+ENTRY_KEY = 'token_blacklist:jti:{}'
+
+
+class BloomFilter:
+    """ Plain bloom filter over strings: no false negatives, false_positive_rate misses go to SQL """
+
+    def __init__(self, capacity, false_positive_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(8, int(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def process_local_cache():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+class RevokedTokens:
+    """
+    Per-worker bloom filter of blacklisted JTIs, built from the database on first
+    use. Revocations are published as a numbered log in the shared cache so the
+    other workers add them incrementally instead of rebuilding; a pruning run
+    bumps the generation, which makes every worker rebuild once. A worker looks
+    at the log at most every TOKEN_BLACKLIST_SYNC_INTERVAL seconds, checks in
+    between never leave the process. With a process-local cache the log never
+    reaches the other workers, so they read recent blacklist rows instead.
+    """
+
+    max_delta = 1000
+    # blacklist rows committed this long after they were stamped are still picked up by the polling
+    poll_overlap = timedelta(minutes=1)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.sequence = 0
+        self.generation = 0
+        self.checked_at = 0
+        self.polled_at = None
+
+    def rebuild(self, sequence, generation):
+        polled_at = timezone.now()
+        jtis = BlacklistedToken.objects.filter(token__expires_at__gt=polled_at) \
+            .values_list('token__jti', flat=True)
+        jtis = list(jtis.iterator(chunk_size=10000))
+        bloom = BloomFilter(max(len(jtis) * 2, settings.TOKEN_BLACKLIST_FILTER_CAPACITY))
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter, self.sequence, self.generation, self.polled_at = bloom, sequence, generation, polled_at
+
+    def poll(self):
+        # process-local cache: the rows other workers blacklisted since the last look
+        polled_at = timezone.now()
+        jtis = BlacklistedToken.objects.filter(blacklisted_at__gte=self.polled_at - self.poll_overlap) \
+            .values_list('token__jti', flat=True)
+        for jti in jtis:
+            if jti not in self.filter:
+                self.filter.add(jti)
+        self.polled_at = polled_at
+
+    def sync(self):
+        now = time.monotonic()
+        if self.filter is not None and now - self.checked_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+            return
+        if process_local_cache():
+            with self.lock:
+                if self.filter is None or self.filter.count >= self.filter.capacity:
+                    self.rebuild(0, 0)
+                else:
+                    self.poll()
+                self.checked_at = now
+            return
+        shared = cache.get_many([SEQUENCE_KEY, GENERATION_KEY])
+        sequence, generation = shared.get(SEQUENCE_KEY, 0), shared.get(GENERATION_KEY, 0)
+        with self.lock:
+            self.checked_at = now
+            if (self.filter is None or generation != self.generation or sequence < self.sequence
+                    or sequence - self.sequence > self.max_delta or self.filter.count >= self.filter.capacity):
+                self.rebuild(sequence, generation)
+                return
+            if sequence == self.sequence:
+                return
+            keys = [ENTRY_KEY.format(number) for number in range(self.sequence + 1, sequence + 1)]
+            entries = cache.get_many(keys)
+            if len(entries) < len(keys):
+                # part of the log was evicted, the database is the source of truth
+                self.rebuild(sequence, generation)
+                return
+            for jti in entries.values():
+                self.filter.add(jti)
+            self.sequence = sequence
+
+    def publish(self, jti):
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        sequence = cache.incr(SEQUENCE_KEY)
+        # incr is read-then-write on the database cache, two workers can draw the same number
+        while not cache.add(ENTRY_KEY.format(sequence), jti, timeout=settings.TOKEN_BLACKLIST_LOG_TTL):
+            sequence = cache.incr(SEQUENCE_KEY)
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def reset(self):
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        cache.incr(GENERATION_KEY)
+
+    def __contains__(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+revoked_tokens = RevokedTokens()
+
+
+def is_revoked(jti):
+    return jti in revoked_tokens
+
+
+def publish_revoked(jti):
+    # other workers rebuild from the database if they see the number before the row is committed
+    transaction.on_commit(lambda: revoked_tokens.publish(jti))
+
+
+def prune_expired_tokens(batch_size=5000):
+    """ Delete expired outstanding tokens (and their blacklist rows) in batches """
+    deleted = 0
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by('id')
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    if deleted:
+        revoked_tokens.reset()
+    return deleted
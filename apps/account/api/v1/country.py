@@ -1,45 +1,100 @@
-import pandas as pd
+import csv
+import io
+import json
+import os
+
 import requests
+from apps.account.api.v1.reference import touch_reference
 from apps.account.models import Country, City
 
+COUNTRIES_URL = "https://restcountries.com/v3.1/all"
+CITIES_URL = "https://gist.githubusercontent.com/ans2human/89f78752e161219060257b160f970fcd/raw/50d755da33db30ecb533d1770d94f9adcc8d6892/world_cities.json"
 
-def get_country():
-    url = "https://restcountries.com/v3.1/all"
 
-    r = requests.get(url).json()
+def read_records(source):
+    """ List of dicts from a local .json/.csv file (or an http(s) URL) """
+    if str(source).startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=(3.05, 60))
+        response.raise_for_status()
+        text, extension = response.text, os.path.splitext(str(source).split('?')[0])[1].lower()
+    else:
+        with open(source, encoding='utf-8-sig') as file:
+            text = file.read()
+        extension = os.path.splitext(str(source))[1].lower()
+    if extension == '.csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    return json.loads(text)
+
+
+def _country_row(record):
+    # restcountries ({"name": {"common": ...}, "flags": {"png": ...}}) or flat {"name", "flag"} rows
+    name, flag = record.get('name'), record.get('flag') or record.get('flags')
+    if isinstance(name, dict):
+        name = name.get('common')
+    if isinstance(flag, dict):
+        flag = flag.get('png')
+    return (name or '').strip(), (flag or '').strip() or None
+
+
+def _country_ids():
+    return {name.casefold(): pk for pk, name in Country.objects.values_list('id', 'name') if name}
+
 
-    df = pd.DataFrame(r)
-    name = df['name']
-    flag = df['flags']
-    try:
-        for i in range(len(name)):
-            country = Country.objects.create(name=name[i].get('common'), flag=flag[i].get('png'))
-            country.save()
-        return 'zor'
-    except Exception as e:
-        return e
+def load_countries(records, chunk_size=1000):
+    """ Insert missing countries and fill missing flags; safe to re-run. Returns (created, updated) """
+    rows = {}
+    for record in records:
+        name, flag = _country_row(record)
+        if name and len(name) <= 50:
+            rows.setdefault(name.casefold(), (name, flag))
+    existing = {country.name.casefold(): country
+                for country in Country.objects.only('id', 'name', 'flag') if country.name}
+    new = [Country(name=name, flag=flag) for key, (name, flag) in rows.items() if key not in existing]
+    Country.objects.bulk_create(new, batch_size=chunk_size, ignore_conflicts=True)
+    stale = []
+    for key, (_, flag) in rows.items():
+        country = existing.get(key)
+        if country and flag and not country.flag:
+            country.flag = flag
+            stale.append(country)
+    Country.objects.bulk_update(stale, ['flag'], batch_size=chunk_size)
+    # bulk writes send no signals
+    touch_reference()
+    return len(new), len(stale)
+
+
+def load_cities(records, chunk_size=5000, name_field='admin_name'):
+    """
+    Insert missing cities, resolving their country by exact (case-insensitive)
+    name through one dict; unknown countries are created first. City names are
+    unique in the schema, a name already taken by another country is skipped.
+    Returns (countries created, cities created).
+    """
+    rows = {}
+    for record in records:
+        name = (record.get(name_field) or record.get('name') or '').strip()
+        country = (record.get('country') or '').strip()
+        if name and country and len(name) <= 50 and len(country) <= 50:
+            rows.setdefault(name.casefold(), (name, country))
+
+    countries = _country_ids()
+    missing = {country.casefold(): country for _, country in rows.values() if country.casefold() not in countries}
+    Country.objects.bulk_create([Country(name=name) for name in missing.values()], batch_size=chunk_size,
+                                ignore_conflicts=True)
+    if missing:
+        countries = _country_ids()
+
+    taken = {name.casefold() for name in City.objects.values_list('name', flat=True) if name}
+    new = [City(name=name, country_id=countries[country.casefold()])
+           for key, (name, country) in rows.items() if key not in taken and country.casefold() in countries]
+    City.objects.bulk_create(new, batch_size=chunk_size, ignore_conflicts=True)
+    touch_reference()
+    return len(missing), len(new)
+
+
+def get_country():
+    return load_countries(read_records(COUNTRIES_URL))
 
 
 def get_city():
-    url = "https://gist.githubusercontent.com/ans2human/89f78752e161219060257b160f970fcd/raw/50d755da33db30ecb533d1770d94f9adcc8d6892/world_cities.json"
-
-    r = requests.get(url).json()
-    df = pd.DataFrame(r)
-    admin_name = df['admin_name']
-    country = df['country']
-    # print(len(admin_name))
-    try:
-        for i in range(len(admin_name)):
-            countries = Country.objects.filter(name__icontains=country[i])
-            if countries.exists():
-                # You can choose one of the matching countries or implement custom logic.
-                # For example, we choose the first matching country here.
-                country_obj = countries.first()
-            else:
-                # If no matching country found, create a new one.
-                country_obj = Country.objects.create(name=country[i])
-            city, created = City.objects.get_or_create(name=admin_name[i], country=country_obj)
-            city.save()
-        return 'zor'
-    except Exception as e:
-        return str(e)
+    return load_cities(read_records(CITIES_URL))
@@ -0,0 +1,12 @@
+import django_filters
+from apps.account.models import Account
+
+
+class AthleteDirectoryFilter(django_filters.rest_framework.FilterSet):
+    # plain ids: no lookup query to validate them
+    country = django_filters.NumberFilter(field_name="country_id", lookup_expr='exact')
+    sport_club = django_filters.NumberFilter(field_name="sport_club_id", lookup_expr='exact')
+
+    class Meta:
+        model = Account
+        fields = ('country', 'sport_club')
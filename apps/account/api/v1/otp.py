@@ -0,0 +1,61 @@
+import hashlib
+import hmac
+import secrets
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from apps.account.models import OneTimeCode
+
+_last_purge = 0
+
+
+def _digest(phone_number, code):
+    message = f'{phone_number}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def purge_expired(force=False):
+    """ Drop expired codes; called opportunistically on issue, at most once per OTP_PURGE_INTERVAL """
+    global _last_purge
+    if not force and time.monotonic() - _last_purge < settings.OTP_PURGE_INTERVAL:
+        return 0
+    _last_purge = time.monotonic()
+    deleted, _ = OneTimeCode.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def issue_code(phone_number):
+    """ Replace the phone number's code with a fresh one and return it in plain text for the SMS """
+    code = f'{secrets.randbelow(1_000_000):06d}'
+    OneTimeCode.objects.update_or_create(
+        phone_number=phone_number,
+        defaults={
+            'code': _digest(phone_number, code),
+            'attempts': 0,
+            'expires_at': timezone.now() + timedelta(seconds=settings.OTP_TTL),
+        }
+    )
+    purge_expired()
+    return code
+
+
+def check_code(phone_number, code, consume=True):
+    """
+    Constant-time comparison against the stored HMAC. Wrong guesses count
+    towards OTP_MAX_ATTEMPTS, after which the code can't be used any more.
+    """
+    if not phone_number or not code:
+        return False
+    otp = OneTimeCode.objects.filter(phone_number=phone_number, expires_at__gt=timezone.now()).first()
+    if not otp or otp.attempts >= settings.OTP_MAX_ATTEMPTS:
+        return False
+    if not hmac.compare_digest(otp.code, _digest(phone_number, str(code))):
+        OneTimeCode.objects.filter(id=otp.id).update(attempts=F('attempts') + 1)
+        return False
+    if consume:
+        otp.delete()
+    return True
@@ -0,0 +1,111 @@
+import threading
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.account.models import City, Country
+
+VERSION_KEY = 'reference:version'
+# sorts after every character a name can contain, closes the prefix range
+PREFIX_END = '\U0010ffff'
+
+
+class Table:
+    """ Rows sorted by casefolded name; `keys` is the parallel array bisect runs on """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[0], row[1]['id']))
+        self.keys = [key for key, _ in rows]
+        self.rows = [row for _, row in rows]
+
+    def prefix(self, prefix, limit=None):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + PREFIX_END, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.rows[start:end]
+
+
+class ReferenceIndex:
+    """
+    Countries and cities held in memory per worker, as ready-to-render dicts in
+    name order. The shared cache carries a version token that signals replace
+    on every change; a worker that sees a new token reloads both tables.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.countries = None
+        self.cities = None
+        self.cities_by_country = None
+
+    def load(self, version):
+        countries = {}
+        for pk, name, flag in Country.objects.values_list('id', 'name', 'flag'):
+            countries[pk] = {'id': pk, 'name': name, 'flag': flag}
+        cities, by_country = [], defaultdict(list)
+        for pk, name, country_id in City.objects.values_list('id', 'name', 'country_id').iterator(chunk_size=10000):
+            country = countries.get(country_id)
+            row = (name.casefold() if name else '', {
+                'id': pk,
+                'name': name,
+                'country': country['name'] if country else None,
+                'country_id': country_id,
+                'flag': country['flag'] if country else None,
+            })
+            cities.append(row)
+            by_country[country_id].append(row)
+        self.countries = Table((row['name'].casefold() if row['name'] else '', row) for row in countries.values())
+        self.cities = Table(cities)
+        self.cities_by_country = {country_id: Table(rows) for country_id, rows in by_country.items()}
+        self.version = version
+
+    def sync(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.load(version)
+        return self.version
+
+    def search_countries(self, prefix=''):
+        self.sync()
+        return self.countries.prefix(prefix.casefold())
+
+    def search_cities(self, prefix='', country_id=None, limit=None):
+        self.sync()
+        table = self.cities if country_id is None else self.cities_by_country.get(country_id)
+        if table is None:
+            return []
+        return table.prefix(prefix.casefold(), limit)
+
+
+reference_index = ReferenceIndex()
+
+
+def touch_reference():
+    """ Make every worker reload the reference tables once the current transaction commits """
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def reference_response(request, data):
+    """ Long-lived public response, revalidated with the reference version as ETag """
+    etag = f'"reference-{reference_index.version}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data, status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.REFERENCE_CACHE_MAX_AGE)
+    return response
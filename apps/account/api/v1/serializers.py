@@ -4,9 +4,13 @@ from django.db.models import Count
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
 
+from apps.account.api.v1.tokens import issue_tokens
+from apps.account.api.v1.utils import store_avatar_later
 from apps.account.api.v1.validators import validate_file_size, is_word_latin
 from apps.account.models import Account, VerifyPhoneNumber, phone_regex, Country, SportClub, City
-from apps.competition.models import Participant
+from apps.base.serializers import DynamicFieldsMixin, ImageVariantField
+from apps.competition.api.v1.serializers import CategorySvgUrlField
+from apps.competition.models import Participant, AthleteStats
 from django.shortcuts import get_object_or_404
 
 
@@ -25,8 +29,23 @@ class RegisterSerializer(serializers.ModelSerializer):
             'id', 'phone_number', 'password', 'first_name', 'last_name', 'email', 'avatar', 'gender', 'birthday',
             'size', 'country', 'sport_club')
 
+    def save_account(self, account, validated_data):
+        # one password hash and one write; the avatar is stored after commit, off the request path
+        avatar = validated_data.pop('avatar', None)
+        password = validated_data.pop('password')
+        for attr, value in validated_data.items():
+            setattr(account, attr, value)
+        account.set_password(password)
+        account.save()
+        if avatar:
+            store_avatar_later(account, avatar)
+        return account
+
     def create(self, validated_data):
-        return Account.objects.create_user(**validated_data)
+        return self.save_account(Account(), validated_data)
+
+    def update(self, instance, validated_data):
+        return self.save_account(instance, validated_data)
 
 
 class LoginSerializer(serializers.ModelSerializer):
@@ -36,8 +55,8 @@ class LoginSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_tokens(obj):
-        user = Account.objects.filter(phone_number=obj.get('phone_number')).first()
-        return user.tokens
+        # the pair minted in validate(), no second lookup or mint
+        return obj.get('tokens')
 
     class Meta:
         model = Account
@@ -55,12 +74,14 @@ class LoginSerializer(serializers.ModelSerializer):
         data = {
             'success': True,
             'phone_number': user.phone_number,
-            'tokens': user.tokens
+            'tokens': issue_tokens(user)
         }
         return data
 
 
 class VerifyPhoneNumberSerializer(serializers.ModelSerializer):
+    code = serializers.CharField(max_length=6, write_only=True)
+
     class Meta:
         model = Account
         fields = ('phone_number', 'code')
@@ -73,11 +94,9 @@ class ResetPasswordSerializer(serializers.Serializer):
 
 
 class VerifyPhoneNumberRegisterSerializer(serializers.ModelSerializer):
-    code = serializers.SerializerMethodField(read_only=True)
-
     class Meta:
         model = Account
-        fields = ('phone_number', 'code')
+        fields = ('phone_number',)
 
 
 class ChangePasswordSerializer(serializers.ModelSerializer):
@@ -97,26 +116,33 @@ class ChangePasswordSerializer(serializers.ModelSerializer):
         if not user.check_password(old_password):
             raise serializers.ValidationError({'success': False, 'message': 'Old password not match'})
 
-        user.set_password(password)
+        user.change_password(password)
         user.save()
         return attrs
 
     def update(self, instance, validated_data):
-        instance.set_password(validated_data['password'])
+        instance.change_password(validated_data['password'])
         instance.save()
         return instance
 
 
-class AccountProfileSerializer(serializers.ModelSerializer):
+class AthleteStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AthleteStats
+        fields = ('distance', 'races', 'best_duration', 'best_position', 'total_distance')
+
+
+class AccountProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     country_name = serializers.CharField(source='country.name', read_only=True)
     # city_name = serializers.CharField(source='address.name', read_only=True)
     club_name = serializers.CharField(source='sport_club.name', read_only=True)
+    stats = AthleteStatsSerializer(many=True, read_only=True)
 
     class Meta:
         model = Account
         fields = [
             'id', 'first_name', 'last_name', 'email', 'phone_number', 'avatar', 'gender', 'birthday', 'country', 'country_name',
-            'address', 'sport_club', 'club_name', 'size', 'date_login', 'date_created'
+            'address', 'sport_club', 'club_name', 'size', 'date_login', 'date_created', 'stats'
         ]
         extra_kwargs = {
             'country_name': {'read_only': True},
@@ -135,6 +161,18 @@ class AboutMeSerializer(serializers.ModelSerializer):
         fields = ['id', 'phone_number', 'get_fullname', 'avatar']
 
 
+class AthleteDirectorySerializer(serializers.ModelSerializer):
+    avatar = ImageVariantField(source='*', field='avatar', variant='small')
+    country_name = serializers.CharField(source='country.name', read_only=True)
+    country_flag = serializers.URLField(source='country.flag', read_only=True)
+    club_name = serializers.CharField(source='sport_club.name', read_only=True)
+
+    class Meta:
+        model = Account
+        fields = ('id', 'first_name', 'last_name', 'avatar', 'gender', 'country', 'country_name', 'country_flag',
+                  'sport_club', 'club_name')
+
+
 class CountrySerializer(serializers.ModelSerializer):
     class Meta:
         model = Country
@@ -161,12 +199,14 @@ class CompetitionResultSerializer(serializers.ModelSerializer):
     title = serializers.CharField(source='competition.title', read_only=True)
     category_name = serializers.CharField(source='choice.title', read_only=True)
     category_icon = serializers.ImageField(source='competition.category.icon', read_only=True)
-    svg = serializers.CharField(source='competition.category.svg', read_only=True)
-    image = serializers.ImageField(source='choice.maps', read_only=True)
+    svg_url = CategorySvgUrlField(source='competition.category')
+    image = ImageVariantField(source='choice', field='maps', variant='small')
 
     class Meta:
         model = Participant
-        fields = ('id', 'title', 'position', 'category_name', 'category_icon', 'svg', 'image', 'duration', 'created_at')
+        fields = (
+            'id', 'title', 'position', 'category_name', 'category_icon', 'svg_url', 'image', 'duration', 'created_at'
+        )
 
 
 class MonthResultSerializer(serializers.Serializer):
@@ -201,7 +241,7 @@ class MyCompetitionsHistorySerializer(serializers.ModelSerializer):
             results = obj.competitions.filter(
                 created_at__month=month,
                 created_at__year=year
-            )
+            ).select_related('competition__category', 'choice').defer('competition__category__svg')
             data.append({
                 'month': f"{month}-{year}",
                 'count': result['total_results'],
@@ -214,11 +254,12 @@ class MyCompetitionsHistorySerializer(serializers.ModelSerializer):
 class SetNewPasswordSerializer(serializers.ModelSerializer):
     password = serializers.CharField(min_length=6, max_length=16, write_only=True)
     password2 = serializers.CharField(min_length=6, max_length=16, write_only=True)
-    code = serializers.CharField(max_length=6, write_only=True)
+    code = serializers.CharField(max_length=6, write_only=True, required=False)
+    phone_number = serializers.CharField(max_length=17, write_only=True)
 
     class Meta:
         model = Account
-        fields = ('password', 'password2', 'code')
+        fields = ('phone_number', 'password', 'password2', 'code')
 
     def validate(self, attrs):
         password = attrs.get('password')
@@ -234,6 +275,6 @@ class SetNewPasswordSerializer(serializers.ModelSerializer):
         return attrs
 
     def update(self, instance, validated_data):
-        instance.set_password(validated_data['password'])
+        instance.change_password(validated_data['password'])
         instance.save()
         return instance
@@ -0,0 +1,180 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import jwt
+import requests
+from django.conf import settings
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apps.account.models import SMSToken
+
+logger = logging.getLogger(__name__)
+
+
+class EskizProvider:
+    """
+    notify.eskiz.uz client. One pooled session per process with timeouts and
+    retries (sends are never repeated); the auth token lives in memory (seeded from SMSToken after a
+    restart) and is only refreshed when it expires or the API answers 401.
+    """
+
+    base_url = 'https://notify.eskiz.uz/api'
+
+    def __init__(self, email, password, sender, callback_url=None, timeout=(3.05, 10), pool_size=10):
+        self.email = email
+        self.password = password
+        self.sender = sender
+        self.callback_url = callback_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # a send that failed with 5xx may still have gone out, only the login is safe to repeat
+        login_retry = retry.new(allowed_methods=frozenset(['POST']))
+        self.session.mount(f'{self.base_url}/auth/',
+                           HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=login_retry))
+        self._token = None
+        self._token_expires = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _expiry(token):
+        try:
+            return jwt.decode(token, options={'verify_signature': False}).get('exp') or time.time() + settings.SMS_TOKEN_TTL
+        except jwt.PyJWTError:
+            return time.time() + settings.SMS_TOKEN_TTL
+
+    def _store(self, token):
+        self._token, self._token_expires = token, self._expiry(token)
+
+    def token(self, refresh=False):
+        with self._lock:
+            if self._token is None and not refresh:
+                stored = SMSToken.objects.last()
+                if stored and stored.token:
+                    self._store(stored.token)
+            if refresh or not self._token or self._token_expires - 60 < time.time():
+                response = self.session.post(f'{self.base_url}/auth/login', timeout=self.timeout,
+                                             data={'email': self.email, 'password': self.password})
+                response.raise_for_status()
+                self._store(response.json()['data']['token'])
+                SMSToken.objects.update_or_create(id=SMSToken.objects.values_list('id', flat=True).last(),
+                                                  defaults={'token': self._token})
+            return self._token
+
+    def _post(self, path, **kwargs):
+        response = self.session.post(f'{self.base_url}/{path}', timeout=self.timeout,
+                                     headers={'Authorization': f'Bearer {self.token()}'}, **kwargs)
+        if response.status_code == 401:
+            response = self.session.post(f'{self.base_url}/{path}', timeout=self.timeout,
+                                         headers={'Authorization': f'Bearer {self.token(refresh=True)}'}, **kwargs)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def phone(phone_number):
+        return ''.join(char for char in str(phone_number) if char.isdigit())
+
+    def send(self, phone_number, message):
+        data = {'mobile_phone': self.phone(phone_number), 'message': message, 'from': self.sender}
+        if self.callback_url:
+            data['callback_url'] = self.callback_url
+        return self._post('message/sms/send', data=data)
+
+    def send_batch(self, messages, dispatch_id=None):
+        """ messages: (user_sms_id, phone_number, text) tuples, sent as a single send-batch request """
+        data = {
+            'messages': [{'user_sms_id': str(sms_id), 'to': self.phone(phone_number), 'text': text}
+                         for sms_id, phone_number, text in messages],
+            'from': self.sender,
+        }
+        if dispatch_id is not None:
+            data['dispatch_id'] = dispatch_id
+        return self._post('message/sms/send-batch', json=data)
+
+
+class StubProvider:
+    """ Offline provider for development and tests, keeps the last messages in `outbox` """
+
+    def __init__(self, *args, **kwargs):
+        self.outbox = deque(maxlen=10000)
+
+    def send(self, phone_number, message):
+        self.outbox.append({'phone_number': str(phone_number), 'message': message})
+        logger.info('SMS to %s: %s', phone_number, message)
+
+    def send_batch(self, messages, dispatch_id=None):
+        for _, phone_number, text in messages:
+            self.outbox.append({'phone_number': str(phone_number), 'message': text})
+        logger.info('SMS batch %s: %s messages', dispatch_id, len(messages))
+
+
+PROVIDERS = {
+    'eskiz': EskizProvider,
+    'stub': StubProvider,
+}
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = PROVIDERS[settings.SMS_PROVIDER](
+            settings.EMAIL, settings.PASSWORD, settings.SMS_SENDER, callback_url=settings.SMS_CALLBACK_URL,
+            timeout=settings.SMS_TIMEOUT, pool_size=settings.SMS_WORKERS,
+        )
+    return _provider
+
+
+class SMSQueue:
+    """
+    In-process outbound queue drained by daemon worker threads. Workers are
+    started on first use, i.e. inside each gunicorn worker after the fork.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            for number in range(len(self.threads), self.workers):
+                thread = threading.Thread(target=self.run, name=f'sms-worker-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def put(self, phone_number, message):
+        if len(self.threads) < self.workers:
+            self.start()
+        self.queue.put((phone_number, message))
+
+    def run(self):
+        while True:
+            phone_number, message = self.queue.get()
+            try:
+                get_provider().send(phone_number, message)
+            except Exception:
+                logger.exception('SMS to %s failed', phone_number)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        self.queue.join()
+
+
+sms_queue = SMSQueue(settings.SMS_WORKERS)
+
+
+def send_sms(phone_number, message):
+    """ Queue a message once the surrounding transaction commits; never blocks the request """
+    transaction.on_commit(lambda: sms_queue.put(phone_number, message))
@@ -0,0 +1,91 @@
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+MAX_BLOCKED = 10000
+
+_blocked = {}
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """ '5/min' -> (5 tokens, 5 / 60 tokens per second) """
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+def _block(key, seconds):
+    with _lock:
+        if len(_blocked) >= MAX_BLOCKED:
+            now = time.monotonic()
+            for expired in [k for k, until in _blocked.items() if until <= now]:
+                del _blocked[expired]
+            if len(_blocked) >= MAX_BLOCKED:
+                _blocked.clear()
+        _blocked[key] = time.monotonic() + seconds
+
+
+class BucketThrottle(BaseThrottle):
+    """
+    Token bucket per key in the shared cache (CACHES): `rate` tokens fill back over the
+    rate's period and a burst may spend all of them. Rates come from
+    DEFAULT_THROTTLE_RATES under '<view.throttle_scope>_<kind>'. A rejected key
+    is remembered in-process until its next token is due, so repeated attempts
+    are turned away without a cache round trip. Reads and writes of a bucket are
+    not atomic, concurrent requests can overspend it by a token or two.
+    """
+
+    kind = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.kind}') if scope else None
+        key = self.get_key(request) if rate else None
+        if key is None:
+            return True
+        key = f'throttle:{scope}:{self.kind}:{key}'
+
+        until = _blocked.get(key)
+        if until:
+            self.retry_after = until - time.monotonic()
+            if self.retry_after > 0:
+                return False
+
+        capacity, refill = parse_rate(rate)
+        now = time.time()
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        if tokens < 1:
+            self.retry_after = (1 - tokens) / refill
+            _block(key, self.retry_after)
+            return False
+        # an untouched bucket is full again after capacity / refill seconds
+        cache.set(key, (tokens - 1, now), timeout=math.ceil(capacity / refill))
+        return True
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
+
+
+class IPBucketThrottle(BucketThrottle):
+    kind = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class PhoneBucketThrottle(BucketThrottle):
+    kind = 'phone'
+
+    def get_key(self, request):
+        phone_number = ''.join(char for char in str(request.data.get('phone_number') or '') if char.isdigit())
+        return phone_number or None
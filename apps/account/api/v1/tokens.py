@@ -0,0 +1,85 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenBlacklistSerializer, TokenObtainPairSerializer, \
+    TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from apps.account.api.v1.authentication import TOKEN_VERSION_CLAIM
+from apps.account.api.v1.blacklist import is_revoked
+
+
+class FilteredRefreshToken(RefreshToken):
+    """ Refresh token whose blacklist check goes through the in-memory filter first """
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+
+def issue_tokens(user):
+    """
+    Mint exactly one refresh/access pair. With the blacklist app installed every
+    RefreshToken.for_user writes an OutstandingToken row, so callers mint once
+    per login and pass the resulting dict around instead of re-minting.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh[TOKEN_VERSION_CLAIM] = user.token_version
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # token/api/access/ pairs carry the token version too
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class FilteredTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
+
+
+def _blacklist_access(token):
+    # access tokens are not tracked as outstanding by simplejwt, register them on revocation
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token['jti'],
+        defaults={
+            'user_id': token.get('user_id'),
+            'token': str(token),
+            'expires_at': datetime_from_epoch(token['exp']),
+        }
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+
+
+def revoke_tokens(user, refresh=None, access=None):
+    """
+    Blacklist the tokens the client actually presented. Raises TokenError for
+    invalid tokens and for tokens that belong to another account.
+    """
+    tokens = []
+    if refresh:
+        tokens.append(refresh if isinstance(refresh, RefreshToken) else FilteredRefreshToken(str(refresh)))
+    if access:
+        tokens.append(access if isinstance(access, AccessToken) else AccessToken(str(access)))
+    for token in tokens:
+        if str(token.get('user_id')) != str(user.id):
+            raise TokenError('Token does not belong to this user')
+    for token in tokens:
+        if isinstance(token, RefreshToken):
+            token.blacklist()
+        else:
+            _blacklist_access(token)
+    return len(tokens)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from apps.account.api.v1.views import RegisterAPIView, LoginAPIView, VerifyPhoneNumberAPIView, \
     ReVerifyPhoneNumberAPIView, ChangePasswordCompletedView, LogoutView, UserProfileListView, \
     PersonalUserProfileDetailView, me, AboutMeListView, MyCompetitionsHistoryListView, CountryListView, \
-    SportClubListView, CityListView, SetNewPasswordCompletedAPIView, ProfileViewSet
+    SportClubListView, CityListView, SetNewPasswordCompletedAPIView, ProfileViewSet, AthleteDirectoryView
 
 router = DefaultRouter()
 
@@ -19,6 +19,7 @@ urlpatterns = [
     path('change-pasword/<str:phone_number>/', ChangePasswordCompletedView.as_view()),
 
     # path('users/', UserProfileListView.as_view()),
+    path('athletes/', AthleteDirectoryView.as_view()),
     path('countries/', CountryListView.as_view()),
     path('cities/', CityListView.as_view()),
     path('sport-clubs/', SportClubListView.as_view()),
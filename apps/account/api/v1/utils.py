@@ -1,42 +1,29 @@
-import os
-import requests
-from django.conf import settings
-from apps.account.models import SMSToken
+from django.core.files.base import ContentFile
 
-EMAIL = settings.EMAIL
-PASSWORD = settings.PASSWORD
+from apps.account.api.v1.authentication import invalidate_user
+from apps.account.api.v1.sms import send_sms
+from apps.account.models import Account
+from apps.base.images import build_field_variants
+from apps.base.tasks import run_in_background
 
 
-def login(email, password):
-    URL = "https://notify.eskiz.uz/api/auth/login"
-    data = {
-        "email": email,
-        "password": password
-    }
-    response = requests.request('POST', URL, data=data)
-    SMSToken.objects.create(token=response.json()['data']['token'])
-    return response
+def verify(phone_number, code):
+    # queued, the request does not wait for the SMS provider
+    send_sms(phone_number, f"Verify code: {code}")
 
 
-def verify(phone_number, code):
-    token_obj = SMSToken.objects.last()
-    if not token_obj:
-        login(EMAIL, PASSWORD)
-        return verify(phone_number, code)
-    token = token_obj.token
-    phone_number = str(phone_number)[1:13]
-    URL = "https://notify.eskiz.uz/api/message/sms/send"
-    PARAMS = {
-        "Authorization": f"Bearer {token}"
-    }
-    data = {
-        'mobile_phone': phone_number,
-        'message': f"Verify code: {code}",
-        'from': '4546',
-        'callback_url': 'http://0000.uz/test.php'
-    }
-    response = requests.request('POST', URL, data=data, headers=PARAMS)
-    if response.status_code == 401:
-        login(EMAIL, PASSWORD)
-        verify(phone_number, code)
-    return response
+def store_avatar(account_id, name, content):
+    account = Account.objects.filter(id=account_id).first()
+    if account:
+        account.avatar.save(name, ContentFile(content), save=False)
+        account.save(update_fields=['avatar'])
+
+
+def store_avatar_later(account, upload):
+    # uploads are capped at 1MB by validate_file_size, keeping the bytes in memory is fine
+    run_in_background(store_avatar, account.id, upload.name, upload.read())
+
+
+def build_avatar_variants(account_id):
+    if build_field_variants(Account, account_id, 'avatar'):
+        invalidate_user(account_id)
@@ -1,62 +1,59 @@
-import random
-
+from django.db import transaction
 from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework import generics, status, permissions, filters, mixins, viewsets
+from rest_framework.pagination import CursorPagination
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
-from apps.account.models import Account, VerifyPhoneNumber, Country, SportClub, City
+from apps.account.models import Account, VerifyPhoneNumber, Country, SportClub, City, normalize_name
+from apps.base.serializers import DynamicFieldsViewMixin
+from .filters import AthleteDirectoryFilter
 from .permissions import IsOwnUserOrReadOnly
 from .serializers import RegisterSerializer, LoginSerializer, VerifyPhoneNumberRegisterSerializer, \
     VerifyPhoneNumberSerializer, ChangePasswordSerializer, AccountProfileSerializer, AboutMeSerializer, \
-    MyCompetitionsHistorySerializer, CountrySerializer, CitySerializer, SetNewPasswordSerializer, SportClubSerializer
+    MyCompetitionsHistorySerializer, CountrySerializer, CitySerializer, SetNewPasswordSerializer, SportClubSerializer, \
+    AthleteDirectorySerializer
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView
+from .otp import check_code, issue_code
+from .reference import reference_index, reference_response
+from .throttles import IPBucketThrottle, PhoneBucketThrottle
+from .tokens import revoke_tokens
 from .utils import verify
 
+CITY_SEARCH_LIMIT = 50
+CITY_SEARCH_MAX_LIMIT = 500
+
 
 class RegisterAPIView(generics.GenericAPIView):
     serializer_class = RegisterSerializer
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'register'
     permission_classes = (permissions.AllowAny,)
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request):
         try:
             phone_number = request.data.get('phone_number')
-            existing_user = Account.objects.filter(phone_number=phone_number).first()
-            if existing_user:
-                if existing_user.is_verified:
+            with transaction.atomic():
+                existing_user = Account.objects.select_for_update().filter(phone_number=phone_number).first()
+                if existing_user and existing_user.is_verified:
                     return Response(
                         {
                             'success': False, 'message': 'Already registered with this phone number'
                         }, status=status.HTTP_400_BAD_REQUEST
                     )
+                # re-registering an unverified number overwrites it; the serializer hashes and saves once
                 serializer = self.serializer_class(instance=existing_user, data=request.data)
                 serializer.is_valid(raise_exception=True)
                 serializer.save()
-                # for hashing password
-                existing_user.set_password(request.data['password'])
-                existing_user.save()
-            else:
-                serializer = self.serializer_class(data=request.data)
-                serializer.is_valid(raise_exception=True)
-                serializer.save()
-            code = str(random.randint(100_000, 999_999))
-            response = verify(phone_number, code)
-            if response.status_code == 200:  # sms provider kelganida ishga tushadi
-                user = get_object_or_404(Account, phone_number=phone_number)
-                user.code = code
-                user.save()
-                return Response({'success': True, 'message': 'Please verify phone number'},
-                                status=status.HTTP_201_CREATED)
-            else:
-                return Response({'success': False, 'message': 'Internal Server Error'},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            # invalid token is not user's problem!
-            # if response.status_code == 401:
-            #     return Response({'success': False, 'message': 'Invalid token, Please try again'},
-            #                     status=status.HTTP_401_UNAUTHORIZED)
+                # both go out after commit: the SMS through the queue, the avatar through the background pool
+                verify(phone_number, issue_code(phone_number))
+            return Response({'success': True, 'message': 'Please verify phone number'},
+                            status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'success': False, 'message': f'{e}'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -64,6 +61,8 @@ class RegisterAPIView(generics.GenericAPIView):
 
 class LoginAPIView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'login'
 
     def post(self, request):
         try:
@@ -75,15 +74,23 @@ class LoginAPIView(generics.GenericAPIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    # token/api/access/ checks passwords too, it shares the login buckets
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'login'
+
+
 class VerifyPhoneNumberAPIView(generics.GenericAPIView):
     serializer_class = VerifyPhoneNumberSerializer
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'verify'
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request):
         phone_number = request.data.get('phone_number')
         code = request.data.get('code')
-        user = get_object_or_404(Account, phone_number=phone_number, code=code)
-        if user:
+        user = get_object_or_404(Account, phone_number=phone_number)
+        if check_code(phone_number, code):
             user.is_verified = True
             user.save()
             return Response({
@@ -95,17 +102,15 @@ class VerifyPhoneNumberAPIView(generics.GenericAPIView):
 
 class ReVerifyPhoneNumberAPIView(generics.GenericAPIView):
     serializer_class = VerifyPhoneNumberRegisterSerializer
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'sms'
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request):
         try:
             phone_number = request.data.get('phone_number')
-            code = str(random.randint(100_000, 999_999))
-            user = get_object_or_404(Account, phone_number=phone_number)
-            if user:
-                user.code = code
-                user.save()
-                verify(phone_number, code)
+            get_object_or_404(Account.objects.only('id'), phone_number=phone_number)
+            verify(phone_number, issue_code(phone_number))
 
             return Response({"success": True, "message": "verify code sent your phone number"},
                             status=status.HTTP_201_CREATED)
@@ -118,17 +123,13 @@ class LogoutView(generics.GenericAPIView):
     permission_classes = (IsAuthenticated,)
 
     def delete(self, request):
+        # revokes the access token of this request and the refresh token sent in the body
         try:
-            user = self.request.user
-            refresh = user.tokens['refresh']
-            access = user.tokens['access']
-            refresh.blacklist()
-            access.blacklist()
-            user.save()
+            revoke_tokens(request.user, refresh=request.data.get('refresh'), access=request.auth)
             return Response({
                 "message": "Logout Success"
             }, status=status.HTTP_204_NO_CONTENT)
-        except:
+        except TokenError:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
@@ -151,22 +152,58 @@ class ChangePasswordCompletedView(generics.UpdateAPIView):
         return Response({'success': True, 'message': 'Successfully set new password'}, status=status.HTTP_200_OK)
 
 
+# AccountProfileSerializer field -> relations it reads
+PROFILE_SELECT_RELATED = {'country_name': ('country',), 'club_name': ('sport_club',)}
+PROFILE_PREFETCH_RELATED = {'stats': ('stats',)}
+
+
 class UserProfileListView(generics.ListAPIView):
     queryset = Account.objects.all()
     serializer_class = AccountProfileSerializer
 
 
-class PersonalUserProfileDetailView(generics.RetrieveUpdateAPIView):
+class PersonalUserProfileDetailView(DynamicFieldsViewMixin, generics.RetrieveUpdateAPIView):
     queryset = Account.objects.all()
     serializer_class = AccountProfileSerializer
+    select_related_fields = PROFILE_SELECT_RELATED
+    prefetch_related_fields = PROFILE_PREFETCH_RELATED
     permission_classes = (IsOwnUserOrReadOnly,)
     parser_classes = (MultiPartParser, FormParser)
     lookup_field = 'phone_number'
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class AthleteDirectoryPagination(CursorPagination):
+    ordering = ('search_name', 'id')
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AthleteDirectoryView(generics.ListAPIView):
+    # ?search=<name prefix, first or last name first>&country=<id>&sport_club=<id>; one query per page
+    serializer_class = AthleteDirectorySerializer
+    pagination_class = AthleteDirectoryPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AthleteDirectoryFilter
+
+    def get_queryset(self):
+        queryset = Account.objects.filter(is_verified=True).select_related('country', 'sport_club').only(
+            'id', 'first_name', 'last_name', 'avatar', 'avatar_variants', 'gender', 'search_name',
+            'country__id', 'country__name', 'country__flag', 'sport_club__id', 'sport_club__name',
+        )
+        search = normalize_name(self.request.query_params.get('search'))
+        if search:
+            queryset = queryset.filter(Q(search_name__startswith=search) | Q(search_name_reversed__startswith=search))
+        return queryset
+
+
+class ProfileViewSet(DynamicFieldsViewMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                     mixins.UpdateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    # no list action, browsing athletes goes through AthleteDirectoryView
     queryset = Account.objects.all()
     serializer_class = AccountProfileSerializer
+    select_related_fields = PROFILE_SELECT_RELATED
+    prefetch_related_fields = PROFILE_PREFETCH_RELATED
     permission_classes = (IsOwnUserOrReadOnly,)
     parser_classes = (MultiPartParser, FormParser)
     lookup_field = 'phone_number'
@@ -174,8 +211,9 @@ class ProfileViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         user = request.user
-        qs = get_object_or_404(Account, id=user.id, is_verified=True)
-        sz = AccountProfileSerializer(qs)
+        qs = get_object_or_404(self.get_queryset(), id=user.id, is_verified=True)
+        sz = AccountProfileSerializer(qs, fields=request.query_params.get('fields'),
+                                      omit=request.query_params.get('omit'))
         return Response(sz.data)
 
 
@@ -203,21 +241,34 @@ class MyCompetitionsHistoryListView(generics.RetrieveAPIView):
 
 
 class CountryListView(generics.ListAPIView):
-    queryset = Country.objects.all().order_by('name')
+    # ?search=<name prefix>; served from the per-worker reference index
     serializer_class = CountrySerializer
-    search_fields = ['name']
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+
+    def list(self, request, *args, **kwargs):
+        return reference_response(request, reference_index.search_countries(
+            request.query_params.get('search', '').strip()))
 
 
 class CityListView(generics.ListCreateAPIView):
+    # ?search=<name prefix>&country=<id>&limit=<n>; a country alone returns all of its cities
     serializer_class = CitySerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
 
-    def get_queryset(self):
-        search = self.request.query_params.get('search')
-        if search:
-            return City.objects.filter(Q(country_id=search) | Q(name__icontains=search)).order_by('country__name')
-        return City.objects.all().order_by('country__name')
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search', '').strip()
+        country = request.query_params.get('country', '').strip()
+        if search.isdigit() and not country:
+            # older clients pass the country id as ?search=
+            country, search = search, ''
+        if country and not country.isdigit():
+            return Response({'country': 'A country id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = None
+        if search or not country:
+            try:
+                limit = min(max(int(request.query_params.get('limit', CITY_SEARCH_LIMIT)), 1), CITY_SEARCH_MAX_LIMIT)
+            except ValueError:
+                limit = CITY_SEARCH_LIMIT
+        return reference_response(request, reference_index.search_cities(
+            search, int(country) if country else None, limit))
 
 
 class SportClubListView(generics.ListCreateAPIView):
@@ -231,16 +282,24 @@ class SportClubListView(generics.ListCreateAPIView):
 class SetNewPasswordCompletedAPIView(mixins.UpdateModelMixin, viewsets.GenericViewSet):
     # http://127.0.0.1:8000/account/api/v1/forgot-password/
     serializer_class = SetNewPasswordSerializer
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'password'
     queryset = Account.objects.all()
     lookup_field = 'code'
     permission_classes = (AllowAny,)
 
-    def patch(self, request, *args, **kwargs):
+    def update(self, request, *args, **kwargs):
+        # the router maps both PUT and PATCH here; the code only identifies a user together with its phone number
         code = self.kwargs['code']
-        user = get_object_or_404(Account, code=code)
-        if not user:
-            return Response({'success': False, 'message': 'User not found'}, status=status.HTTP_400_BAD_REQUEST)
-        serializer = self.serializer_class(instance=user, data=request.data, context={'request': request, 'code': code})
+        phone_number = request.data.get('phone_number')
+        # validate first: a mistyped confirmation must not burn the code
+        serializer = self.serializer_class(data=request.data, context={'request': request, 'code': code})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            # the code is consumed together with the password change, or not at all
+            if not check_code(phone_number, code):
+                return Response({'success': False, 'message': 'Phone number or code invalid'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            serializer.instance = get_object_or_404(Account, phone_number=phone_number)
+            serializer.save()
         return Response({'success': True, 'message': 'Successfully set new password'}, status=status.HTTP_200_OK)
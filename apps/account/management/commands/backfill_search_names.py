@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.account.models import Account
+
+
+class Command(BaseCommand):
+    help = 'Fill Account.search_name / search_name_reversed for accounts saved before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--all', action='store_true', help='recompute every account, not only empty ones')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.only('id', 'first_name', 'last_name', 'search_name', 'search_name_reversed')
+        if not options['all']:
+            accounts = accounts.filter(search_name='').exclude(first_name__isnull=True, last_name__isnull=True)
+        batch, updated = [], 0
+        for account in accounts.order_by('id').iterator(chunk_size=options['batch_size']):
+            account.set_search_name()
+            batch.append(account)
+            if len(batch) >= options['batch_size']:
+                updated += Account.objects.bulk_update(batch, ['search_name', 'search_name_reversed'])
+                batch = []
+        if batch:
+            updated += Account.objects.bulk_update(batch, ['search_name', 'search_name_reversed'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} accounts'))
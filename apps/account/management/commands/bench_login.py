@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from apps.account.api.v1.serializers import LoginSerializer
+from apps.account.models import Account
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput (logins/s, queries and minted tokens per login); rolls back every write'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--phone-number', default='+998000000001')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        password = 'bench-password'
+        try:
+            with transaction.atomic():
+                Account.objects.create_user(options['phone_number'], password, is_verified=True)
+                outstanding = OutstandingToken.objects.count()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        serializer = LoginSerializer(data={'phone_number': options['phone_number'],
+                                                           'password': password})
+                        serializer.is_valid(raise_exception=True)
+                        serializer.data
+                    elapsed = time.perf_counter() - started
+                minted = OutstandingToken.objects.count() - outstanding
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f'logins:              {iterations}')
+        self.stdout.write(f'logins per second:   {iterations / elapsed:.1f}')
+        self.stdout.write(f'ms per login:        {elapsed / iterations * 1000:.2f}')
+        self.stdout.write(f'queries per login:   {len(queries) / iterations:.1f}')
+        self.stdout.write(f'tokens per login:    {minted / iterations:.1f}')
@@ -0,0 +1,66 @@
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from apps.account.api.v1.views import RegisterAPIView
+from apps.account.models import Account
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measure registration throughput (registrations/s, queries per registration) through '
+            'RegisterAPIView; rolls back every write, so deferred SMS and avatar work never runs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--avatar-size', type=int, default=200 * 1024, help='bytes')
+        parser.add_argument('--reregister', action='store_true',
+                            help='register over existing unverified accounts with the same phone numbers')
+
+    @staticmethod
+    def phone_number(number):
+        return f'+99890{number:07d}'
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = APIRequestFactory()
+        view = RegisterAPIView.as_view()
+        avatar = b'\0' * options['avatar_size']
+        failed = 0
+        try:
+            with transaction.atomic():
+                if options['reregister']:
+                    Account.objects.bulk_create(
+                        Account(phone_number=self.phone_number(number), password='!') for number in range(iterations)
+                    )
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for number in range(iterations):
+                        request = factory.post('/account/api/v1/register/', {
+                            'phone_number': self.phone_number(number),
+                            'password': 'bench-password',
+                            'first_name': 'Bench',
+                            'last_name': 'Runner',
+                            'email': f'bench{number}@example.com',
+                            'birthday': '1990-01-01',
+                            'avatar': SimpleUploadedFile('avatar.jpg', avatar, content_type='image/jpeg'),
+                        }, format='multipart')
+                        if view(request).status_code != 201:
+                            failed += 1
+                    elapsed = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f'registrations:              {iterations}')
+        self.stdout.write(f'failed:                     {failed}')
+        self.stdout.write(f'registrations per second:   {iterations / elapsed:.1f}')
+        self.stdout.write(f'ms per registration:        {elapsed / iterations * 1000:.2f}')
+        self.stdout.write(f'queries per registration:   {len(queries) / iterations:.1f}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.account.api.v1.utils import build_avatar_variants
+from apps.account.models import Account
+
+
+class Command(BaseCommand):
+    help = 'Build the resized avatar variants for accounts uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='rebuild every avatar, not only ones without variants')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.exclude(avatar__isnull=True).exclude(avatar='')
+        if not options['all']:
+            accounts = accounts.filter(avatar_variants={})
+        built = failed = 0
+        for account_id in accounts.order_by('id').values_list('id', flat=True).iterator():
+            try:
+                build_avatar_variants(account_id)
+                built += 1
+            except (OSError, ValueError) as e:
+                # missing files and images Pillow cannot read
+                failed += 1
+                self.stderr.write(f'Account {account_id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Built variants for {built} accounts, {failed} failed'))
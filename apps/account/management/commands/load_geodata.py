@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.account.api.v1.country import read_records, load_countries, load_cities
+
+
+class Command(BaseCommand):
+    help = ('Load countries and cities from local JSON/CSV files (restcountries / world_cities formats or flat '
+            'name, flag / name, country columns); re-runs only add what is missing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--countries', help='path (or URL) of the countries file')
+        parser.add_argument('--cities', help='path (or URL) of the cities file')
+        parser.add_argument('--city-field', default='admin_name',
+                            help='city name column, falls back to "name" (default: admin_name)')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not options['countries'] and not options['cities']:
+            raise CommandError('Pass --countries and/or --cities')
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                if options['countries']:
+                    created, updated = load_countries(read_records(options['countries']), options['chunk_size'])
+                    self.stdout.write(f'countries: {created} created, {updated} flags filled')
+                if options['cities']:
+                    countries, cities = load_cities(read_records(options['cities']), options['chunk_size'],
+                                                    name_field=options['city_field'])
+                    self.stdout.write(f'cities: {cities} created ({countries} countries added)')
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.account.api.v1.otp import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired verification codes (issuing a code also does this periodically)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(force=True)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired codes'))
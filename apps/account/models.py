@@ -1,3 +1,5 @@
+import re
+import unicodedata
 from datetime import datetime
 
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
@@ -5,7 +7,6 @@ from django.core.validators import RegexValidator
 from django.contrib.auth.models import PermissionsMixin
 from django.db import models
 from django.db.models import Count
-from rest_framework_simplejwt.tokens import RefreshToken
 
 phone_regex = RegexValidator(
     regex=r'^[\+]?[(]?[0-9]{3}[)]?[-\s\.]?[0-9]{3}[-\s\.]?[0-9]{4,6}$',
@@ -25,6 +26,16 @@ SIZE = (
 )
 
 
+APOSTROPHES = re.compile(r"['`\u2018\u2019\u02bb\u02bc]")
+
+
+def normalize_name(*parts):
+    """ 'O‘g‘iloy  Ásqarova' -> 'ogiloy asqarova': casefolded, accents and apostrophes dropped """
+    text = unicodedata.normalize('NFKD', ' '.join(part for part in parts if part))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(APOSTROPHES.sub('', text).casefold().split())
+
+
 class AccountManager(BaseUserManager):
     def create_user(self, phone_number, password=None, **extra_fields):
         if not phone_number:
@@ -87,8 +98,9 @@ class Account(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True, db_index=True, null=True)
     phone_number = models.CharField(validators=[phone_regex], max_length=17, blank=True,
                                     unique=True, help_text='for example: +998945588859')  # validators should be a list
-    code = models.CharField(max_length=6, null=True, blank=True, unique=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # resized copies of the avatar, built in the background (apps.base.images.build_variants)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     gender = models.CharField(max_length=6, choices=GENDER, default='none', help_text='none, male, female', null=True)
     birthday = models.DateField(null=True, blank=True)
     size = models.CharField(max_length=5, choices=SIZE, default='none', help_text='none, xs, s, m, l, xl, xxl, xxxl, ')
@@ -101,6 +113,10 @@ class Account(AbstractBaseUser, PermissionsMixin):
     is_admin = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    # normalize_name('first last') and ('last first'), prefix searched by the athlete directory
+    search_name = models.CharField(max_length=450, blank=True, default='', editable=False)
+    search_name_reversed = models.CharField(max_length=450, blank=True, default='', editable=False)
     date_login = models.DateTimeField(auto_now=True)
     date_created = models.DateTimeField(auto_now_add=True)
 
@@ -108,6 +124,31 @@ class Account(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'phone_number'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets postgres serve LIKE 'prefix%' from the index under any collation
+            models.Index(fields=['search_name'], name='account_search_name_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['search_name_reversed'], name='account_search_name_rev_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
+    def set_search_name(self):
+        self.search_name = normalize_name(self.first_name, self.last_name)
+        self.search_name_reversed = normalize_name(self.last_name, self.first_name)
+
+    def save(self, *args, **kwargs):
+        self.set_search_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_name', 'search_name_reversed'}
+        super().save(*args, **kwargs)
+
+    def change_password(self, raw_password):
+        # issued tokens carry the version they were minted with, bumping it revokes them all;
+        # plain set_password() is left alone for hash upgrades on login
+        self.set_password(raw_password)
+        self.token_version += 1
+
     def get_fullname(self):
         if self.first_name and self.last_name:
             return f'{self.first_name} {self.last_name}'
@@ -122,12 +163,9 @@ class Account(AbstractBaseUser, PermissionsMixin):
 
     @property
     def tokens(self):
-        refresh = RefreshToken.for_user(self)
-        data = {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token)
-        }
-        return data
+        # mints (and stores) a new pair on every access, read it once per login
+        from apps.account.api.v1.tokens import issue_tokens
+        return issue_tokens(self)
 
     def __str__(self):
         if self.phone_number:
@@ -135,6 +173,16 @@ class Account(AbstractBaseUser, PermissionsMixin):
         return "None phone number"
 
 
+class OneTimeCode(models.Model):
+    phone_number = models.CharField(max_length=17, unique=True)
+    code = models.CharField(max_length=64, help_text='HMAC of the code, never the code itself')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.phone_number} - {self.expires_at}"
+
+
 class VerifyPhoneNumber(models.Model):
     class Meta:
         verbose_name = "Confirm phone number"
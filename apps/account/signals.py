@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from apps.account.api.v1.authentication import invalidate_user
+from apps.account.api.v1.blacklist import publish_revoked
+from apps.account.api.v1.reference import touch_reference
+from apps.account.api.v1.utils import build_avatar_variants
+from apps.account.models import Account, City, Country
+from apps.base.images import DEFERRED, delete_variants, image_changed, loaded_name
+from apps.base.tasks import run_in_background
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def drop_cached_account(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_init, sender=Account)
+def remember_avatar(sender, instance, **kwargs):
+    instance._avatar_name = loaded_name(instance, 'avatar')
+
+
+@receiver(post_save, sender=Account)
+def schedule_avatar_variants(sender, instance, created, update_fields, **kwargs):
+    previous, current = instance._avatar_name, loaded_name(instance, 'avatar')
+    instance._avatar_name = current
+    if not image_changed(previous, current, created, update_fields, 'avatar'):
+        return
+    variants = instance.avatar_variants
+    if variants:
+        # the old sizes belong to the old picture
+        instance.avatar_variants = {}
+        Account.objects.filter(pk=instance.pk).update(avatar_variants={})
+    if previous or variants:
+        run_in_background(delete_variants, instance.avatar.storage, None if previous is DEFERRED else previous,
+                          variants)
+    if current and current is not DEFERRED:
+        run_in_background(build_avatar_variants, instance.pk)
+
+
+@receiver(pre_delete, sender=Account)
+def delete_avatar_variants(sender, instance, **kwargs):
+    # before the row goes, a deferred avatar can still be read; the files go after commit
+    if instance.avatar or instance.avatar_variants:
+        run_in_background(delete_variants, instance.avatar.storage, instance.avatar.name, instance.avatar_variants)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def publish_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        publish_revoked(instance.token.jti)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def refresh_reference(sender, **kwargs):
+    touch_reference()
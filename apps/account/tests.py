@@ -1,3 +1,222 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from apps.account.api.v1.authentication import clear_user_cache
+from apps.account.api.v1.blacklist import revoked_tokens
+from apps.account.api.v1 import throttles
+from apps.account.api.v1.otp import check_code, issue_code
+from apps.account.api.v1.throttles import IPBucketThrottle, PhoneBucketThrottle
+from apps.account.models import Account, OneTimeCode
+
+PHONE_NUMBER = '+998901234567'
+PASSWORD = 'secret-1'
+
+
+def wrong_code(code):
+    return f'{(int(code) + 1) % 1_000_000:06d}'
+
+
+class AccountTestCase(TestCase):
+    def setUp(self):
+        # module level state outlives the test transaction
+        revoked_tokens.filter = None
+        clear_user_cache()
+        self.client = APIClient()
+        self.user = Account.objects.create_user(phone_number=PHONE_NUMBER, password=PASSWORD, is_verified=True)
+
+    def login(self, password=PASSWORD):
+        response = self.client.post('/account/api/v1/login/', {'phone_number': PHONE_NUMBER, 'password': password})
+        self.assertEqual(response.status_code, 200)
+        return response.data['tokens']
+
+    def me(self, access):
+        return self.client.get('/account/api/v1/users/me/?fields=id', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh(self, refresh):
+        return self.client.post('/token/api/refresh/', {'refresh': refresh})
+
+
+@override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+class RevocationTest(AccountTestCase):
+    def test_logout_revokes_both_tokens_across_a_generation_bump(self):
+        tokens = self.login()
+        self.assertEqual(self.me(tokens['access']).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete('/account/api/v1/logout/', {'refresh': tokens['refresh']}, format='json',
+                                          HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+        # a pruning run makes every worker rebuild its filter from the database
+        generation = revoked_tokens.generation
+        revoked_tokens.reset()
+        self.assertEqual(self.me(tokens['access']).status_code, 401)
+        self.assertEqual(revoked_tokens.generation, generation + 1)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        # the other session is untouched
+        self.assertEqual(self.me(self.login()['access']).status_code, 200)
+
+    def test_password_reset_revokes_issued_tokens(self):
+        tokens = self.login()
+        self.assertEqual(self.me(tokens['access']).status_code, 200)
+        response = self.client.put(f'/account/api/v1/forgot-password/{issue_code(PHONE_NUMBER)}/', {
+            'phone_number': PHONE_NUMBER, 'password': 'secret-2', 'password2': 'secret-2',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me(tokens['access']).status_code, 401)
+        # a refresh still signs, but the access token it mints carries the old version
+        refreshed = self.refresh(tokens['refresh'])
+        self.assertEqual(self.me(refreshed.data['access']).status_code, 401)
+        self.assertEqual(self.me(self.login('secret-2')['access']).status_code, 200)
+
+
+class BlacklistQueryTest(AccountTestCase):
+    def test_valid_token_never_reads_the_blacklist(self):
+        access = self.login()['access']
+        # the first check builds the filter
+        self.assertEqual(self.me(access).status_code, 200)
+        for interval_passed in (False, True):
+            if interval_passed:
+                revoked_tokens.checked_at = 0
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.me(access).status_code, 200)
+            tables = ' '.join(query['sql'] for query in queries.captured_queries)
+            self.assertNotIn('token_blacklist_blacklistedtoken', tables)
+            if not interval_passed:
+                self.assertNotIn('cache_table', tables)
+
+
+class OneTimeCodeTest(TestCase):
+    def test_code_is_stored_hashed(self):
+        code = issue_code(PHONE_NUMBER)
+        self.assertNotEqual(OneTimeCode.objects.get(phone_number=PHONE_NUMBER).code, code)
+
+    def test_wrong_code(self):
+        code = issue_code(PHONE_NUMBER)
+        self.assertFalse(check_code(PHONE_NUMBER, wrong_code(code)))
+        self.assertFalse(check_code('+998901234568', code))
+        self.assertEqual(OneTimeCode.objects.get(phone_number=PHONE_NUMBER).attempts, 1)
+        self.assertTrue(check_code(PHONE_NUMBER, code))
+
+    def test_expired_code(self):
+        code = issue_code(PHONE_NUMBER)
+        OneTimeCode.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(check_code(PHONE_NUMBER, code))
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_attempts_run_out(self):
+        code = issue_code(PHONE_NUMBER)
+        for _ in range(3):
+            self.assertFalse(check_code(PHONE_NUMBER, wrong_code(code)))
+        self.assertFalse(check_code(PHONE_NUMBER, code))
+        # a new code starts over
+        self.assertTrue(check_code(PHONE_NUMBER, issue_code(PHONE_NUMBER)))
+
+    def test_single_use(self):
+        code = issue_code(PHONE_NUMBER)
+        self.assertTrue(check_code(PHONE_NUMBER, code, consume=False))
+        self.assertTrue(check_code(PHONE_NUMBER, code))
+        self.assertFalse(check_code(PHONE_NUMBER, code))
+
+
+class ForgotPasswordTest(AccountTestCase):
+    def reset(self, code, password, password2):
+        return self.client.put(f'/account/api/v1/forgot-password/{code}/', {
+            'phone_number': PHONE_NUMBER, 'password': password, 'password2': password2,
+        })
+
+    def test_invalid_form_keeps_the_code(self):
+        code = issue_code(PHONE_NUMBER)
+        self.assertEqual(self.reset(code, 'secret-2', 'secret-3').status_code, 400)
+        self.assertEqual(self.reset(code, 'secret-2', 'secret-2').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('secret-2'))
+        # and it is gone after the reset
+        self.assertEqual(self.reset(code, 'secret-4', 'secret-4').status_code, 400)
+
+    def test_wrong_code_changes_nothing(self):
+        code = issue_code(PHONE_NUMBER)
+        self.assertEqual(self.reset(wrong_code(code), 'secret-2', 'secret-2').status_code, 400)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(PASSWORD))
+
+
+class ThrottledView(APIView):
+    # login rates: 5/min per phone number, 30/min per address
+    authentication_classes = ()
+    permission_classes = ()
+    throttle_classes = (IPBucketThrottle, PhoneBucketThrottle)
+    throttle_scope = 'login'
+
+    def post(self, request):
+        return Response({})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+
+class BucketThrottleTest(TestCase):
+    def setUp(self):
+        # rejected keys are remembered in-process against the fake clock
+        throttles._blocked.clear()
+        self.addCleanup(throttles._blocked.clear)
+        self.clock = Clock()
+        patcher = mock.patch.object(throttles, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, phone_number=PHONE_NUMBER, address='10.0.0.1'):
+        request = APIRequestFactory().post('/', {'phone_number': phone_number}, REMOTE_ADDR=address)
+        return ThrottledView.as_view()(request)
+
+    def test_burst_then_429_with_retry_after(self):
+        for _ in range(5):
+            self.assertEqual(self.post().status_code, 200)
+        response = self.post()
+        self.assertEqual(response.status_code, 429)
+        # one token per 60 / 5 seconds
+        self.assertEqual(response['Retry-After'], '12')
+
+    def test_tokens_refill_over_the_period(self):
+        for _ in range(5):
+            self.post()
+        self.clock.now += 11
+        self.assertEqual(self.post().status_code, 429)
+        self.clock.now += 1
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(self.post().status_code, 429)
+        # an idle bucket fills up to its capacity, no further
+        self.clock.now += 600
+        for _ in range(5):
+            self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(self.post().status_code, 429)
+
+    def test_phone_bucket_follows_the_number_across_addresses(self):
+        for _ in range(5):
+            self.post(address='10.0.0.1')
+        self.assertEqual(self.post(address='10.0.0.2').status_code, 429)
+        # formatting does not make a new bucket
+        self.assertEqual(self.post(phone_number='998 90 123 45 67', address='10.0.0.3').status_code, 429)
+        self.assertEqual(self.post(phone_number='+998901234568').status_code, 200)
+
+    def test_ip_bucket_spans_phone_numbers(self):
+        for number in range(30):
+            self.assertEqual(self.post(phone_number=f'+99890{number:07d}').status_code, 200)
+        self.assertEqual(self.post(phone_number='+998911111111').status_code, 429)
+        self.assertEqual(self.post(phone_number='+998911111111', address='10.0.0.2').status_code, 200)
@@ -0,0 +1,208 @@
+import io
+import math
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# variant name -> longest side in pixels
+SIZES = {'small': 128, 'medium': 512}
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+TILE_SIZE = 256
+DZI_TEMPLATE = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{format}" Overlap="0" '
+                'TileSize="{tile_size}"><Size Width="{width}" Height="{height}"/></Image>')
+
+# snapshot of an image field that was not loaded (.only() / .defer())
+DEFERRED = object()
+
+
+def loaded_name(instance, field):
+    """ File name in `field` of `instance`, DEFERRED when it was not loaded; never queries """
+    value = instance.__dict__.get(field, DEFERRED)
+    return getattr(value, 'name', value) or None
+
+
+def image_changed(previous, current, created, update_fields, field):
+    """ post_save test against a post_init loaded_name() snapshot """
+    if previous is DEFERRED:
+        return field in (update_fields or ())
+    return created or previous != current
+
+
+def variant_name(name, variant, fmt):
+    """
+    'avatars/me.png' -> 'avatars/variants/me.png.small.webp', the same name for the
+    same upload every time; the extension stays in so me.png and me.jpg do not collide
+    """
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'variants', f'{filename}.{variant}.{FORMATS[fmt][0]}')
+
+
+def _open(field_file, draft=None):
+    with field_file.open('rb') as file:
+        image = Image.open(file)
+        if draft:
+            # jpeg decodes straight at a fraction of the resolution when that is still large enough
+            image.draft('RGB', (draft, draft))
+        image = ImageOps.exif_transpose(image)
+        return image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # no alpha in jpeg, flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, **FORMATS[fmt][1])
+    return buffer.getvalue()
+
+
+def _store(storage, name, content):
+    # deterministic names: replace instead of letting the storage pick a free one
+    storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def build_variants(field_file, sizes=SIZES, image=None):
+    """
+    Resize the image in `field_file` to every size of `sizes` (never upscaling)
+    and store each as WebP and JPEG next to the original. Returns the JSON kept
+    on the model: {variant: {'width', 'height', 'webp': name, 'jpeg': name}}.
+    """
+    # largest first, each size is shrunk from the previous one
+    image = image.copy() if image is not None else _open(field_file, draft=max(sizes.values()))
+    variants = {}
+    for variant, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for fmt in FORMATS:
+            variants[variant][fmt] = _store(field_file.storage, variant_name(field_file.name, variant, fmt),
+                                            _encode(image, fmt))
+    return variants
+
+
+def build_tiles(field_file, image=None, tile_size=TILE_SIZE):
+    """
+    Deep Zoom pyramid: level n is the image scaled to fit 2**n pixels (the last
+    level is full size), cut into tile_size squares stored as
+    <dir>/tiles/<name>_files/<level>/<col>_<row>.<ext> with a <name>.dzi
+    descriptor, the layout OpenSeadragon and most map viewers read. Each level
+    is halved from the one above rather than resized from the original.
+    """
+    fmt = settings.IMAGE_VARIANT_FORMAT
+    extension = FORMATS[fmt][0]
+    storage = field_file.storage
+    image = image if image is not None else _open(field_file)
+    width, height = image.size
+    levels = math.ceil(math.log2(max(width, height))) + 1 if max(width, height) > 1 else 1
+    directory, filename = os.path.split(field_file.name)
+    # the full file name, like variant_name(), so course.png and course.jpg get separate pyramids
+    base = os.path.join(directory, 'tiles', filename)
+
+    for level in range(levels - 1, -1, -1):
+        for row, top in enumerate(range(0, image.height, tile_size)):
+            for col, left in enumerate(range(0, image.width, tile_size)):
+                tile = image.crop((left, top, min(left + tile_size, image.width), min(top + tile_size, image.height)))
+                _store(storage, f'{base}_files/{level}/{col}_{row}.{extension}', _encode(tile, fmt))
+        if level:
+            # rounds up like the deep zoom level sizes do
+            image = image.reduce(2)
+
+    descriptor = DZI_TEMPLATE.format(format=extension, tile_size=tile_size, width=width, height=height)
+    return {
+        'dzi': _store(storage, f'{base}.dzi', descriptor.encode()),
+        'tiles': f'{base}_files',
+        'format': extension,
+        'tile_size': tile_size,
+        'width': width,
+        'height': height,
+        'levels': levels,
+    }
+
+
+def _delete_tree(storage, directory):
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        storage.delete(os.path.join(directory, name))
+    for name in directories:
+        _delete_tree(storage, os.path.join(directory, name))
+    if hasattr(storage, 'path'):
+        # the file system storage leaves empty directories behind
+        try:
+            os.rmdir(storage.path(directory))
+        except OSError:
+            pass
+
+
+def delete_variants(storage, name, variants=None):
+    """
+    Remove what build_variants() and build_tiles() made from the image `name`,
+    found by their deterministic names, plus any file recorded in `variants`
+    (for when the name is not known). The original is django_cleanup's.
+    """
+    names, tile_directories = set(), set()
+    if name:
+        directory, filename = os.path.split(name)
+        extensions = {extension for extension, _ in FORMATS.values()}
+        try:
+            stored = storage.listdir(os.path.join(directory, 'variants'))[1]
+        except FileNotFoundError:
+            stored = ()
+        for variant in stored:
+            # <filename>.<variant>.<ext> only, me.png.small.webp but not me.png.1.png.small.webp
+            parts = variant[len(filename) + 1:].split('.') if variant.startswith(f'{filename}.') else ()
+            if len(parts) == 2 and parts[1] in extensions:
+                names.add(os.path.join(directory, 'variants', variant))
+        base = os.path.join(directory, 'tiles', filename)
+        names.add(f'{base}.dzi')
+        tile_directories.add(f'{base}_files')
+    for variant, value in (variants or {}).items():
+        if variant == 'tiles':
+            names.add(value['dzi'])
+            tile_directories.add(value['tiles'])
+        else:
+            names.update(value[fmt] for fmt in FORMATS if fmt in value)
+    for variant in names:
+        storage.delete(variant)
+    for directory in tile_directories:
+        _delete_tree(storage, directory)
+
+
+def build_field_variants(model, pk, field, sizes=SIZES, tiles=False):
+    """
+    Background job: variants (and optionally the tile pyramid) of `field` on one
+    row, saved to `<field>_variants` only if the row still holds the image they
+    were made from; a newer upload schedules its own run. Returns whether it saved.
+    """
+    instance = model.objects.filter(pk=pk).only('pk', field).first()
+    field_file = getattr(instance, field, None)
+    if not field_file:
+        return False
+    image = _open(field_file, draft=None if tiles else max(sizes.values()))
+    variants = build_variants(field_file, sizes, image=image)
+    if tiles:
+        variants['tiles'] = build_tiles(field_file, image=image)
+    if model.objects.filter(pk=pk, **{field: field_file.name}).update(**{f'{field}_variants': variants}):
+        return True
+    # replaced or deleted while this ran, after its own cleanup already went through
+    delete_variants(field_file.storage, field_file.name)
+    return False
+
+
+def variant_url(field_file, variants, variant, fmt=None):
+    """ URL of a stored variant, the original's while variants are not built yet """
+    if not field_file:
+        return None
+    name = (variants or {}).get(variant, {}).get(fmt or settings.IMAGE_VARIANT_FORMAT)
+    return field_file.storage.url(name) if name else field_file.url
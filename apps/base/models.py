@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.backends.ddl_references import Statement
 
 
 class BaseModel(models.Model):
@@ -7,3 +9,22 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class PostgresGinIndex(GinIndex):
+    """
+    GinIndex declared for every database but only built on PostgreSQL; other
+    backends run a comment instead, so the model state and its migrations do
+    not depend on the database the project was set up with.
+    """
+
+    def _skip(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return Statement('-- %(name)s is only built on PostgreSQL', name=self.name)
+        return None
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        return self._skip(schema_editor) or super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        return self._skip(schema_editor) or super().remove_sql(model, schema_editor, **kwargs)
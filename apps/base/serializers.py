@@ -0,0 +1,122 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from apps.base.images import variant_url
+
+
+def parse_fields(value):
+    """ 'id,maps.title,maps.svg' -> {'id': {}, 'maps': {'title': {}, 'svg': {}}}; an empty subtree means all of it """
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _nested(field):
+    field = getattr(field, 'child', field)
+    return field if isinstance(field, serializers.BaseSerializer) and hasattr(field, 'fields') else None
+
+
+def prune(serializer, keep=None, omit=None):
+    """ Drop fields of `serializer` (and of its nested serializers) outside `keep` or inside `omit` """
+    fields = serializer.fields
+    if keep:
+        for name in set(fields) - set(keep):
+            fields.pop(name)
+    for name, subtree in (keep or {}).items():
+        nested = _nested(fields[name]) if name in fields else None
+        if subtree and nested is not None:
+            prune(nested, keep=subtree)
+    for name, subtree in (omit or {}).items():
+        if name not in fields:
+            continue
+        nested = _nested(fields[name])
+        if not subtree:
+            fields.pop(name)
+        elif nested is not None:
+            prune(nested, omit=subtree)
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets: ?fields=id,title,competition_maps.title keeps only the
+    named fields, dotted names reach into nested serializers; ?omit= drops
+    them instead. Only the serializer a view builds for a read request looks
+    at the query string, `fields=` / `omit=` kwargs work everywhere.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if fields is None and omit is None and request is not None and request.method in SAFE_METHODS:
+            fields, omit = request.query_params.get('fields'), request.query_params.get('omit')
+        if fields or omit:
+            prune(self, keep=parse_fields(fields), omit=parse_fields(omit))
+
+
+class DynamicFieldsViewMixin:
+    """
+    Query side of DynamicFieldsMixin. `select_related_fields` and
+    `prefetch_related_fields` map a serializer field to the lookups it reads;
+    only the lookups of fields that survive ?fields= / ?omit= are applied.
+    """
+
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_serializer().fields
+        select = {lookup for name, lookups in self.select_related_fields.items() if name in fields
+                  for lookup in lookups}
+        prefetch = [lookup for name, lookups in self.prefetch_related_fields.items() if name in fields
+                    for lookup in lookups]
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    URL of one size of an image field (apps.base.images), read from the object
+    at `source`: ImageVariantField(source='user', field='avatar', variant='small')
+    reads user.avatar and user.avatar_variants.
+    """
+
+    def __init__(self, field, variant, **kwargs):
+        self.image_field, self.variant = field, variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        url = variant_url(getattr(obj, self.image_field), getattr(obj, f'{self.image_field}_variants'), self.variant)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request and url else url
+
+
+class ImageTilesField(serializers.ReadOnlyField):
+    """ Deep zoom pyramid of an image field (apps.base.images.build_tiles), None until it is built """
+
+    def __init__(self, field, **kwargs):
+        self.image_field = field
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        tiles = (getattr(obj, f'{self.image_field}_variants') or {}).get('tiles')
+        if not tiles:
+            return None
+        storage = getattr(obj, self.image_field).storage
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request else str
+        return {
+            'dzi': absolute(storage.url(tiles['dzi'])),
+            # storage.url() would escape the braces
+            'url': absolute(storage.url(tiles['tiles'])) + '/{z}/{x}_{y}.' + tiles['format'],
+            'tile_size': tiles['tile_size'],
+            'width': tiles['width'],
+            'height': tiles['height'],
+            'max_zoom': tiles['levels'] - 1,
+        }
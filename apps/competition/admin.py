@@ -1,8 +1,18 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path
 from import_export.admin import ImportExportModelAdmin
 from .resource import ParticipantResource
+from apps.account.models import SportClub
+from apps.base.tasks import run_in_background
+from apps.competition.broadcasts import RESUMABLE, run_broadcast
+from apps.competition.registrations import RosterError, import_roster
 from apps.competition.api.v1.qrcode import check_qrcode
-from apps.competition.models import Competition, Category, Participant, CompetitionTexts, CompetitionMaps, HistoryImage
+from apps.competition.models import Competition, Category, Participant, CompetitionTexts, CompetitionMaps, HistoryImage, \
+    AthleteStats, TeamStanding, AthleteRating, Checkpoint, CourseRoute, Broadcast
 
 
 class CompetitionTextsInline(admin.TabularInline):
@@ -36,11 +46,58 @@ class ParticipantInline(admin.StackedInline):
     extra = 1
 
 
+class CheckpointInline(admin.TabularInline):
+    model = Checkpoint
+    extra = 1
+    fields = ('title', 'distance')
+
+
+class CourseRouteInline(admin.StackedInline):
+    model = CourseRoute
+    fields = ('gpx', 'length', 'points', 'bounds')
+    readonly_fields = ('length', 'points', 'bounds')
+
+
+class RosterImportForm(forms.Form):
+    file = forms.FileField(help_text='.csv or .xlsx')
+    sport_club = forms.ModelChoiceField(queryset=SportClub.objects.all())
+    dry_run = forms.BooleanField(required=False, help_text='validate and count only, nothing is saved')
+
+
 class CompetitionMapsAdmin(admin.ModelAdmin):
-    inlines = [ParticipantInline]
+    inlines = [CourseRouteInline, CheckpointInline, ParticipantInline]
     list_display = ('competition', 'title')
     readonly_fields = ('image_tag',)
 
+    def get_urls(self):
+        return [
+            path('<int:object_id>/import-roster/', self.admin_site.admin_view(self.import_roster_view),
+                 name='competition_competitionmaps_import_roster'),
+        ] + super().get_urls()
+
+    def import_roster_view(self, request, object_id):
+        choice = get_object_or_404(CompetitionMaps, id=object_id)
+        if not self.has_change_permission(request, choice):
+            raise PermissionDenied
+        report = None
+        form = RosterImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                report = import_roster(form.cleaned_data['file'], form.cleaned_data['sport_club'], choice,
+                                       dry_run=form.cleaned_data['dry_run'])
+                report['dry_run'] = form.cleaned_data['dry_run']
+            except RosterError as e:
+                self.message_user(request, f'{e}', messages.ERROR)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': choice,
+            'title': 'Import club roster',
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/competition/competitionmaps/import_roster.html', context)
+
 
 class ParticipantAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     resource_classes = [ParticipantResource]
@@ -57,7 +114,45 @@ class ParticipantAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     generate_qrcodes.short_description = "Generate QR codes for selected participants"
 
 
+class AthleteStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'distance', 'races', 'best_duration', 'best_position', 'total_distance')
+    search_fields = ('user__first_name', 'user__last_name', 'user__phone_number', 'distance')
+    readonly_fields = ('user', 'distance', 'races', 'best_duration', 'best_position', 'total_distance')
+
+
+class TeamStandingAdmin(admin.ModelAdmin):
+    list_display = ('choice', 'kind', 'rank', 'sport_club', 'country', 'score', 'finishers', 'gold', 'silver', 'bronze')
+    list_filter = ('kind', 'competition')
+
+
+class AthleteRatingAdmin(admin.ModelAdmin):
+    list_display = ('rank', 'user', 'points', 'races')
+    search_fields = ('user__first_name', 'user__last_name', 'user__phone_number')
+    ordering = ('rank',)
+
+
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('competition', 'choice', 'status', 'sent', 'total', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'total', 'sent', 'cursor', 'error', 'started_at', 'finished_at')
+    actions = ['send_broadcasts']
+
+    def send_broadcasts(self, request, queryset):
+        # failed broadcasts resume from their cursor
+        ids = list(queryset.filter(status__in=RESUMABLE).values_list('id', flat=True))
+        Broadcast.objects.filter(id__in=ids).update(status='queued')
+        for broadcast_id in ids:
+            run_in_background(run_broadcast, broadcast_id)
+        self.message_user(request, f"{len(ids)} broadcasts queued.")
+
+    send_broadcasts.short_description = "Send selected broadcasts"
+
+
 admin.site.register(CompetitionMaps, CompetitionMapsAdmin)
 admin.site.register(Competition, CompetitionAdmin)
 admin.site.register(Category)
 admin.site.register(Participant, ParticipantAdmin)
+admin.site.register(AthleteStats, AthleteStatsAdmin)
+admin.site.register(TeamStanding, TeamStandingAdmin)
+admin.site.register(AthleteRating, AthleteRatingAdmin)
+admin.site.register(Broadcast, BroadcastAdmin)
@@ -1,12 +1,38 @@
+from django.urls import reverse
 from rest_framework import serializers
-from apps.competition.models import Category, Competition, CompetitionMaps, Participant, CompetitionTexts, HistoryImage
+from apps.account.models import SportClub
+from apps.base.images import variant_url
+from apps.base.serializers import DynamicFieldsMixin, ImageTilesField, ImageVariantField
+from apps.competition.models import Category, Competition, CompetitionMaps, Participant, CompetitionTexts, HistoryImage, \
+    TeamStanding, AthleteRating, Checkpoint, CourseRoute
+from apps.competition.splits import unpack_splits
 from apps.main.api.v1.serializers import PartnerSerializer
 
 
+class CategorySvgUrlField(serializers.ReadOnlyField):
+    """ URL of a category's SVG under its content hash, in place of the SVG itself """
+
+    def to_representation(self, category):
+        if not category.svg_hash:
+            return None
+        url = reverse('category_svg', kwargs={'pk': category.pk, 'svg_hash': category.svg_hash})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
 class CategorySerializer(serializers.ModelSerializer):
+    # nested in every competition row, the svg itself is only linked
+    svg_url = CategorySvgUrlField(source='*')
+
     class Meta:
         model = Category
-        fields = ('id', 'title', 'icon', 'svg')
+        fields = ('id', 'title', 'icon', 'svg_url')
+
+
+class CategoryDetailSerializer(CategorySerializer):
+    # category lists, where each svg appears once
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ('svg',)
 
 
 class CompetitionTextsSerializer(serializers.ModelSerializer):
@@ -33,7 +59,7 @@ class BannerParticipantsSerializer(serializers.ModelSerializer):
     def get_avatar(self, obj):
         request = self.context.get('request')
         if request and obj.user.avatar:
-            return request.build_absolute_uri(obj.user.avatar.url)
+            return request.build_absolute_uri(variant_url(obj.user.avatar, obj.user.avatar_variants, 'small'))
         return None
 
     class Meta:
@@ -42,6 +68,7 @@ class BannerParticipantsSerializer(serializers.ModelSerializer):
 
 
 class BannerImagesSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(source='*', field='image', variant='medium')
     count = serializers.SerializerMethodField()
     category = CategorySerializer(many=False)
     competition_participants = serializers.SerializerMethodField()
@@ -60,6 +87,7 @@ class BannerImagesSerializer(serializers.ModelSerializer):
 
 
 class FutureCompetitionSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(source='*', field='image', variant='medium')
     category = CategorySerializer(many=False)
     last_distance = serializers.CharField(source='competition_maps.last.title', read_only=True)
 
@@ -68,14 +96,24 @@ class FutureCompetitionSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'image', 'category', 'last_distance', 'period')
 
 
+class CheckpointSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Checkpoint
+        fields = ('id', 'title', 'distance')
+
+
 class ParticipantListSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(source='user.get_fullname', read_only=True)
     flag = serializers.URLField(source='user.address.flag', read_only=True)
-    avatar = serializers.ImageField(source='user.avatar', read_only=True)
+    avatar = ImageVariantField(source='user', field='avatar', variant='small')
+    splits = serializers.SerializerMethodField()
 
     class Meta:
         model = Participant
-        fields = ('id', 'position', 'full_name', 'avatar', 'flag', 'personal_id', 'distance', 'duration')
+        fields = ('id', 'position', 'full_name', 'avatar', 'flag', 'personal_id', 'distance', 'duration', 'splits')
+
+    def get_splits(self, obj):
+        return unpack_splits(obj.splits)
 
     def get_smallest_duration(self, participants):
         smallest_duration = None
@@ -102,12 +140,16 @@ class ParticipantListSerializer(serializers.ModelSerializer):
 class ChoiceParticipantSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(source='user.get_fullname', read_only=True)
     flag = serializers.URLField(source='user.address.flag', read_only=True)
-    avatar = serializers.ImageField(source='user.avatar', read_only=True)
+    avatar = ImageVariantField(source='user', field='avatar', variant='small')
     is_active = serializers.SerializerMethodField()
+    splits = serializers.SerializerMethodField()
 
     class Meta:
         model = Participant
-        fields = ('id', 'position', 'full_name', 'avatar', 'flag', 'personal_id', 'distance', 'duration', 'is_active')
+        fields = (
+            'id', 'position', 'full_name', 'avatar', 'flag', 'personal_id', 'distance', 'duration', 'splits',
+            'is_active'
+        )
         extra_kwargs = {
             "position": {"read_only": True},
             "personal_id": {"read_only": True},
@@ -121,9 +163,12 @@ class ChoiceParticipantSerializer(serializers.ModelSerializer):
             return True
         return False
 
+    def get_splits(self, obj):
+        return unpack_splits(obj.splits)
+
 
 class ChoiceSerializer(serializers.ModelSerializer):
-    svg = serializers.CharField(source='competition.category.svg', read_only=True)
+    svg_url = CategorySvgUrlField(source='competition.category')
     participants = serializers.SerializerMethodField()
 
     def get_participants(self, obj):
@@ -133,12 +178,13 @@ class ChoiceSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CompetitionMaps
-        fields = ('id', 'title', 'svg', 'participants')
+        fields = ('id', 'title', 'svg_url', 'participants')
 
 
 class CompetitionMapsUserListSerializer(serializers.ModelSerializer):
     participants = serializers.SerializerMethodField()
-    svg = serializers.CharField(source='competition.category.svg', read_only=True)
+    svg_url = CategorySvgUrlField(source='competition.category')
+    checkpoints = CheckpointSerializer(many=True, read_only=True)
 
     def get_participants(self, obj):
         participants = Participant.objects.filter(choice_id=obj.id).order_by('duration')
@@ -146,12 +192,12 @@ class CompetitionMapsUserListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CompetitionMaps
-        fields = ('id', 'title', 'svg', 'participants')
+        fields = ('id', 'title', 'svg_url', 'checkpoints', 'participants')
 
 
 class CompetitionMapsListSerializer(serializers.ModelSerializer):
     participants = serializers.SerializerMethodField()
-    svg = serializers.CharField(source='competition.category.svg', read_only=True)
+    svg_url = CategorySvgUrlField(source='competition.category')
 
     def get_participants(self, obj):
         participants = Participant.objects.filter(choice_id=obj.id).order_by('duration')
@@ -159,7 +205,7 @@ class CompetitionMapsListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CompetitionMaps
-        fields = ('id', 'title', 'svg', 'participants')
+        fields = ('id', 'title', 'svg_url', 'participants')
 
 
 class CompetitionMapssTitleSerializer(serializers.ModelSerializer):
@@ -169,6 +215,7 @@ class CompetitionMapssTitleSerializer(serializers.ModelSerializer):
 
 
 class PastCompetitionSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(source='*', field='image', variant='medium')
     category = CategorySerializer(many=False)
     distances = CompetitionMapsListSerializer(many=True, source='competition_maps')
     competition_title = CompetitionMapssTitleSerializer(many=True, source='competition_maps')
@@ -183,9 +230,9 @@ class PastCompetitionSerializer(serializers.ModelSerializer):
 class ParticipantRetrieveSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(source='user.get_fullname', read_only=True)
     flag = serializers.CharField(source='user.address.flag', read_only=True)
-    avatar = serializers.ImageField(source='user.avatar', read_only=True)
+    avatar = ImageVariantField(source='user', field='avatar', variant='medium')
     competition_title = serializers.CharField(source='competition.title', read_only=True)
-    competition_image = serializers.ImageField(source='competition.image', read_only=True)
+    competition_image = ImageVariantField(source='competition', field='image', variant='medium')
     competition_category = serializers.CharField(source='competition.category.title', read_only=True)
     competition_distance = serializers.CharField(source='choice.title', read_only=True)
 
@@ -197,8 +244,10 @@ class ParticipantRetrieveSerializer(serializers.ModelSerializer):
 
 
 class CompetitionMapImagesSerializer(serializers.ModelSerializer):
+    maps = ImageVariantField(source='*', field='maps', variant='medium')
+    maps_tiles = ImageTilesField(source='*', field='maps')
     participants = serializers.SerializerMethodField()
-    svg = serializers.CharField(source='competition.category.svg', read_only=True)
+    svg_url = CategorySvgUrlField(source='competition.category')
 
     def get_participants(self, obj):
         participants = Participant.objects.filter(choice_id=obj.id).order_by('duration')
@@ -206,16 +255,28 @@ class CompetitionMapImagesSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CompetitionMaps
-        fields = ('id', 'title', 'maps', 'svg', 'participants')
+        fields = ('id', 'title', 'maps', 'maps_tiles', 'svg_url', 'participants')
 
 
 class HistoryImageSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(source='*', field='image', variant='large')
+
     class Meta:
         model = HistoryImage
         fields = ('id', 'image', 'image_url')
 
 
-class CompetitionDetailSerializer(serializers.ModelSerializer):
+class GalleryImageSerializer(serializers.ModelSerializer):
+    thumbnail = ImageVariantField(source='*', field='image', variant='small')
+    image = ImageVariantField(source='*', field='image', variant='large')
+    original = serializers.ImageField(source='image', read_only=True)
+
+    class Meta:
+        model = HistoryImage
+        fields = ('id', 'thumbnail', 'image', 'original', 'image_url')
+
+
+class CompetitionDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category_icon = serializers.ImageField(source='category.icon', read_only=True)
     competition_texts = CompetitionTextsSerializer(many=True)
     competition_maps = CompetitionMapImagesSerializer(many=True)
@@ -223,7 +284,9 @@ class CompetitionDetailSerializer(serializers.ModelSerializer):
     free_joiners_count = serializers.SerializerMethodField()
     partners = PartnerSerializer(many=True)
     is_joined = serializers.SerializerMethodField()
-    history_images = HistoryImageSerializer(many=True, read_only=True)
+    # the images themselves are paged through GalleryListView
+    history_count = serializers.SerializerMethodField()
+    history_cover = serializers.SerializerMethodField()
 
     def get_is_joined(self, obj):
         request = self.context.get('request')
@@ -236,6 +299,19 @@ class CompetitionDetailSerializer(serializers.ModelSerializer):
             return False
         return False
 
+    def get_history_count(self, obj):
+        return obj.history_images.count()
+
+    def get_history_cover(self, obj):
+        cover = obj.history_images.only('id', 'image', 'image_variants', 'image_url').order_by('id').first()
+        if not cover:
+            return None
+        if not cover.image:
+            return cover.image_url
+        url = variant_url(cover.image, cover.image_variants, 'medium')
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_joiners_count(self, obj):
         return obj.competition_participants.count()
 
@@ -250,7 +326,8 @@ class CompetitionDetailSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'sub_title', 'amount', 'youtube', 'media', 'category_icon', 'competition_maps', 'period',
             'distance', 'members', 'joiners_count', 'free_joiners_count', 'where_is_ticket', 'limit', 'about', 'link',
-            'file', 'competition_texts', 'partners', 'is_joined', 'history_images', 'regulation_link', 'offer_link'
+            'file', 'competition_texts', 'partners', 'is_joined', 'history_count', 'history_cover', 'regulation_link',
+            'offer_link'
         )
 
 
@@ -261,6 +338,8 @@ class JoinToCompetitionCreateSerializer(serializers.ModelSerializer):
 
 
 class MyCompetitionListSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(source='*', field='image', variant='medium')
+
     class Meta:
         model = Competition
         fields = ('id', 'title', 'image', 'category', 'distance', 'period')
@@ -270,3 +349,92 @@ class ParticipantQRCodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Participant
         fields = ('id', 'qr_code')
+
+
+class TeamStandingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    distance = serializers.CharField(source='choice.title', read_only=True)
+    team_id = serializers.SerializerMethodField()
+    name = serializers.SerializerMethodField()
+    flag = serializers.SerializerMethodField()
+
+    def get_team_id(self, obj):
+        return obj.sport_club_id if obj.kind == 'club' else obj.country_id
+
+    def get_name(self, obj):
+        team = obj.sport_club if obj.kind == 'club' else obj.country
+        return team.name if team else None
+
+    def get_flag(self, obj):
+        if obj.kind == 'country':
+            return obj.country.flag if obj.country else None
+        if obj.sport_club and obj.sport_club.flag:
+            request = self.context.get('request')
+            url = obj.sport_club.flag.url
+            return request.build_absolute_uri(url) if request else url
+        return None
+
+    class Meta:
+        model = TeamStanding
+        fields = (
+            'id', 'kind', 'choice', 'distance', 'rank', 'team_id', 'name', 'flag', 'score', 'scored', 'finishers',
+            'best_position', 'gold', 'silver', 'bronze'
+        )
+
+
+class AthleteRatingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user_id = serializers.IntegerField(source='user.id', read_only=True)
+    full_name = serializers.CharField(source='user.get_fullname', read_only=True)
+    avatar = ImageVariantField(source='user', field='avatar', variant='small')
+    flag = serializers.URLField(source='user.country.flag', read_only=True)
+    club_name = serializers.CharField(source='user.sport_club.name', read_only=True)
+
+    class Meta:
+        model = AthleteRating
+        fields = ('rank', 'user_id', 'full_name', 'avatar', 'flag', 'club_name', 'points', 'races')
+
+
+class SplitComparisonSerializer(serializers.ModelSerializer):
+    full_name = serializers.CharField(source='user.get_fullname', read_only=True)
+    splits = serializers.SerializerMethodField()
+    paces = serializers.SerializerMethodField()
+
+    def get_splits(self, obj):
+        return self.context['splits'][obj.id]
+
+    def get_paces(self, obj):
+        return self.context['paces'][obj.id]
+
+    class Meta:
+        model = Participant
+        fields = ('id', 'position', 'full_name', 'personal_id', 'duration', 'splits', 'paces')
+
+
+class CourseRouteSerializer(serializers.ModelSerializer):
+    zoom = serializers.SerializerMethodField()
+    levels = serializers.SerializerMethodField()
+    polyline = serializers.SerializerMethodField()
+
+    def get_zoom(self, obj):
+        return self.context.get('level')
+
+    def get_levels(self, obj):
+        return sorted(int(level) for level in obj.polylines)
+
+    def get_polyline(self, obj):
+        level = self.context.get('level')
+        return obj.polylines.get(str(level)) if level is not None else None
+
+    class Meta:
+        model = CourseRoute
+        fields = ('choice', 'length', 'points', 'bounds', 'levels', 'zoom', 'polyline')
+
+
+class RosterImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    sport_club = serializers.PrimaryKeyRelatedField(queryset=SportClub.objects.all())
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate_file(self, file):
+        if not file.name.lower().endswith(('.csv', '.xlsx', '.xls')):
+            raise serializers.ValidationError('Upload a .csv or .xlsx file')
+        return file
@@ -1,10 +1,13 @@
 from django.urls import path
 from .views import CategoryListView, BannerImagesListView, FutureCompetitionListView, PastCompetitionListView, \
     ParticipantRetrieveView, CompetitionDetailRetrieveAPIView, JoinToCompetitionCreateView, MyCompetitionGetListView, \
-    MyOldCompetitionsListView, ParticipantQRCodeView, ChoiceListView, ChoiceParticipantListView
+    MyOldCompetitionsListView, ParticipantQRCodeView, ChoiceListView, ChoiceParticipantListView, TeamStandingListView, \
+    AthleteRatingListView, SplitComparisonView, CourseRouteRetrieveView, RosterImportView, CategorySvgView, \
+    GalleryListView
 
 urlpatterns = [
     path('category/', CategoryListView.as_view()),
+    path('category/<int:pk>/<slug:svg_hash>.svg', CategorySvgView.as_view(), name='category_svg'),
     path('competitions/future/', FutureCompetitionListView.as_view()),
     path('competitions/present/', BannerImagesListView.as_view()),
     path('competitions/past/', PastCompetitionListView.as_view()),
@@ -12,9 +15,15 @@ urlpatterns = [
     path('participant/<int:competition_id>/<int:choice_id>/', ChoiceParticipantListView.as_view()),
     path('participant/<int:choice_id>/', ParticipantRetrieveView.as_view()),
     path('detail/<int:pk>/', CompetitionDetailRetrieveAPIView.as_view()),
+    path('gallery/<int:competition_id>/', GalleryListView.as_view()),
     path('join/<int:choice_id>/', JoinToCompetitionCreateView.as_view()),
     path('my-competitions/', MyCompetitionGetListView.as_view()),
     path('my-old-competitions/', MyOldCompetitionsListView.as_view()),
+    path('standings/<int:competition_id>/', TeamStandingListView.as_view()),
+    path('ratings/', AthleteRatingListView.as_view()),
+    path('splits/<int:choice_id>/', SplitComparisonView.as_view()),
+    path('route/<int:choice_id>/', CourseRouteRetrieveView.as_view()),
+    path('roster/<int:choice_id>/', RosterImportView.as_view()),
 
     path('participant/qrcode/<int:competition_id>/', ParticipantQRCodeView.as_view(), name='user_qrcode'),
 ]
@@ -1,22 +1,54 @@
+from django.db import transaction
 from django.db.models import Q
-from django.http import Http404
-from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, status, permissions, filters
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from apps.competition.models import Category, Competition, CompetitionMaps, Participant
+from rest_framework.views import APIView
+from apps.base.serializers import DynamicFieldsViewMixin
+from apps.competition.models import Category, Competition, CompetitionMaps, Participant, TeamStanding, AthleteRating, \
+    CourseRoute, HistoryImage
+from apps.competition.registrations import RosterError, import_roster
+from apps.competition.routes import pick_level, viewport_zoom
+from apps.competition.splits import split_matrix, segment_paces, field_summary, nan_to_none
 from .qrcode import check_qrcode
 
-from .serializers import CategorySerializer, BannerImagesSerializer, FutureCompetitionSerializer, \
+from .serializers import CategoryDetailSerializer, BannerImagesSerializer, FutureCompetitionSerializer, \
     PastCompetitionSerializer, CompetitionDetailSerializer, JoinToCompetitionCreateSerializer, \
-    CompetitionMapsUserListSerializer, ParticipantQRCodeSerializer, ChoiceParticipantSerializer, ChoiceSerializer
+    CompetitionMapsUserListSerializer, ParticipantQRCodeSerializer, ChoiceParticipantSerializer, ChoiceSerializer, \
+    TeamStandingSerializer, AthleteRatingSerializer, CheckpointSerializer, SplitComparisonSerializer, \
+    CourseRouteSerializer, RosterImportSerializer, GalleryImageSerializer
 
 from .filters import BannerCompetitionFilter
 
+# a year, the longest lifetime caches are asked to honour
+SVG_MAX_AGE = 60 * 60 * 24 * 365
+
 
 class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all().order_by('id')
-    serializer_class = CategorySerializer
+    serializer_class = CategoryDetailSerializer
+
+
+class CategorySvgView(APIView):
+    # content-addressed: a changed svg gets a new hash and URL, so any cached copy stays valid forever
+    def get(self, request, pk, svg_hash):
+        category = Category.objects.filter(pk=pk).values('svg', 'svg_hash').first()
+        if not category or not category['svg_hash']:
+            raise Http404
+        if category['svg_hash'] != svg_hash:
+            return redirect('category_svg', pk=pk, svg_hash=category['svg_hash'])
+        etag = f'"{svg_hash}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(category['svg'], content_type='image/svg+xml; charset=utf-8')
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={SVG_MAX_AGE}, immutable'
+        return response
 
 
 class BannerImagesListView(generics.ListAPIView):
@@ -53,14 +85,14 @@ class PastCompetitionListView(generics.ListAPIView):
 
 
 class ChoiceListView(generics.ListAPIView):
-    queryset = CompetitionMaps.objects.all()
+    queryset = CompetitionMaps.objects.select_related('competition__category').defer('competition__category__svg')
     serializer_class = ChoiceSerializer
 
     def get(self, request, *args, **kwargs):
         competition_id = self.kwargs['competition_id']
         user = self.request.user
         qs = self.queryset.filter(competition_id=competition_id)
-        sz = self.serializer_class(qs, context={'user': user}, many=True)
+        sz = self.serializer_class(qs, context={'user': user, 'request': request}, many=True)
         return Response(sz.data, status=status.HTTP_200_OK)
 
 
@@ -86,7 +118,7 @@ class ChoiceParticipantListView(generics.ListAPIView):
 
 
 class ParticipantRetrieveView(generics.ListAPIView):
-    queryset = CompetitionMaps.objects.all()
+    queryset = CompetitionMaps.objects.select_related('competition__category').defer('competition__category__svg')
     serializer_class = CompetitionMapsUserListSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     lookup_field = 'choice_id'
@@ -101,10 +133,35 @@ class ParticipantRetrieveView(generics.ListAPIView):
         return self.queryset.filter(Q(competition_id=choice_id))
 
 
-class CompetitionDetailRetrieveAPIView(generics.RetrieveAPIView):
+class CompetitionDetailRetrieveAPIView(DynamicFieldsViewMixin, generics.RetrieveAPIView):
+    # ?fields= / ?omit= trim the payload, unrequested relations are not loaded
     queryset = Competition.objects.all()
     serializer_class = CompetitionDetailSerializer
     lookup_field = 'pk'
+    # the maps' svg reads competition.category, prefetched maps point back to this competition
+    select_related_fields = {'category_icon': ('category',), 'competition_maps': ('category',)}
+    prefetch_related_fields = {
+        'competition_texts': ('competition_texts',),
+        'competition_maps': ('competition_maps',),
+        'partners': ('partners',),
+    }
+
+
+class GalleryPagination(CursorPagination):
+    ordering = ('id',)
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class GalleryListView(generics.ListAPIView):
+    # history images of a competition in upload order, thumbnails come from the background variant builder
+    serializer_class = GalleryImageSerializer
+    pagination_class = GalleryPagination
+
+    def get_queryset(self):
+        return HistoryImage.objects.filter(competition_id=self.kwargs['competition_id']) \
+            .only('id', 'image', 'image_variants', 'image_url')
 
 
 class JoinToCompetitionCreateView(generics.CreateAPIView):
@@ -116,17 +173,21 @@ class JoinToCompetitionCreateView(generics.CreateAPIView):
         competition_map_id = self.kwargs['choice_id']
         user = self.request.user
         competition_map = get_object_or_404(CompetitionMaps, id=competition_map_id)
-        competition = get_object_or_404(Competition, id=competition_map.competition.id)
-        participant_count = competition.competition_participants.count()
-        if competition.competition_participants.filter(user=user):
-            return Response({"message": "You have already joined this competition"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if competition.members <= participant_count:
-            return Response({"message": "Sorry, this competition is full"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if competition_map and competition.status == 'now':
-            Participant.objects.get_or_create(user=user, choice_id=competition_map.id, competition_id=competition.id)
-            return Response({'message': 'Success'}, status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            # same lock as the roster import, the count below stays valid until the insert commits
+            competition = get_object_or_404(Competition.objects.select_for_update(), id=competition_map.competition_id)
+            participant_count = competition.competition_participants.count()
+            if competition.competition_participants.filter(user=user):
+                return Response({"message": "You have already joined this competition"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            if competition.members <= participant_count:
+                return Response({"message": "Sorry, this competition is full"}, status=status.HTTP_400_BAD_REQUEST)
+
+            if competition_map and competition.status == 'now':
+                Participant.objects.get_or_create(user=user, choice_id=competition_map.id,
+                                                  competition_id=competition.id)
+                return Response({'message': 'Success'}, status=status.HTTP_201_CREATED)
         return Response({'status': False, 'message': 'Something went wrong! Maybe you don\'t insert tall or weight'},
                         status=status.HTTP_400_BAD_REQUEST)
 
@@ -173,3 +234,134 @@ class ParticipantQRCodeView(generics.RetrieveAPIView):
             raise Http404
         check_qrcode(participant)
         return participant
+
+
+class TeamStandingListView(DynamicFieldsViewMixin, generics.ListAPIView):
+    # ?kind=club|country&choice=<competition map id>
+    queryset = TeamStanding.objects.all()
+    serializer_class = TeamStandingSerializer
+    select_related_fields = {
+        'distance': ('choice',),
+        'name': ('sport_club', 'country'),
+        'flag': ('sport_club', 'country'),
+    }
+
+    def get_queryset(self):
+        qs = super().get_queryset().filter(competition_id=self.kwargs['competition_id'])
+        kind = self.request.query_params.get('kind')
+        choice_id = self.request.query_params.get('choice')
+        if kind:
+            qs = qs.filter(kind=kind)
+        if choice_id and choice_id.isdigit():
+            qs = qs.filter(choice_id=choice_id)
+        return qs.order_by('choice_id', 'kind', 'rank')
+
+
+class RatingPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class AthleteRatingListView(DynamicFieldsViewMixin, generics.ListAPIView):
+    # ranks are written by the rate_athletes command, this only reads them
+    queryset = AthleteRating.objects.filter(rank__isnull=False).order_by('rank')
+    serializer_class = AthleteRatingSerializer
+    select_related_fields = {
+        'user_id': ('user',),
+        'full_name': ('user',),
+        'avatar': ('user',),
+        'flag': ('user__country',),
+        'club_name': ('user__sport_club',),
+    }
+    pagination_class = RatingPagination
+
+
+class SplitComparisonView(generics.GenericAPIView):
+    # ?participants=1,2,3 (participant ids), defaults to the requesting user
+    queryset = Participant.objects.all()
+    serializer_class = SplitComparisonSerializer
+
+    def get(self, request, *args, **kwargs):
+        choice = get_object_or_404(CompetitionMaps, id=self.kwargs['choice_id'])
+        checkpoints = list(choice.checkpoints.all())
+        distances = [checkpoint.distance for checkpoint in checkpoints]
+
+        rows = list(self.queryset.filter(choice_id=choice.id, splits__isnull=False).values_list('id', 'splits'))
+        matrix = split_matrix([blob for _, blob in rows], len(checkpoints))
+        paces = segment_paces(matrix, distances)
+        index = {participant_id: row for row, (participant_id, _) in enumerate(rows)}
+
+        ids = [pk for pk in self.request.query_params.get('participants', '').split(',') if pk.isdigit()]
+        selected = self.queryset.filter(choice_id=choice.id).select_related('user').order_by('duration')
+        if ids:
+            selected = selected.filter(id__in=ids[:20])
+        elif request.user.is_authenticated:
+            selected = selected.filter(user=request.user)
+        else:
+            selected = selected.none()
+
+        empty = [None] * len(checkpoints)
+        context = {
+            'splits': {p.id: nan_to_none(matrix[index[p.id]], digits=0) if p.id in index else empty for p in selected},
+            'paces': {p.id: nan_to_none(paces[index[p.id]]) if p.id in index else empty for p in selected},
+        }
+        best_splits, median_splits = field_summary(matrix, digits=0)
+        best_paces, median_paces = field_summary(paces)
+        return Response({
+            'id': choice.id,
+            'title': choice.title,
+            'checkpoints': CheckpointSerializer(checkpoints, many=True).data,
+            'field': {
+                'count': len(rows),
+                'best_splits': best_splits,
+                'median_splits': median_splits,
+                'best_paces': best_paces,
+                'median_paces': median_paces,
+            },
+            'participants': self.serializer_class(selected, many=True, context=context).data,
+        }, status=status.HTTP_200_OK)
+
+
+class CourseRouteRetrieveView(generics.RetrieveAPIView):
+    # ?zoom=<map zoom> or ?bbox=<south,west,north,east>&width=<viewport px>; defaults to the overview level
+    queryset = CourseRoute.objects.all()
+    serializer_class = CourseRouteSerializer
+    lookup_field = 'choice_id'
+
+    def get_zoom(self):
+        params = self.request.query_params
+        try:
+            if params.get('zoom'):
+                return float(params['zoom'])
+            if params.get('bbox') and params.get('width'):
+                bounds = [float(value) for value in params['bbox'].split(',')]
+                if len(bounds) == 4:
+                    return viewport_zoom(bounds, float(params['width']))
+        except ValueError:
+            pass
+        return 0
+
+    def retrieve(self, request, *args, **kwargs):
+        route = self.get_object()
+        level = pick_level(route.polylines, self.get_zoom())
+        serializer = self.serializer_class(route, context={**self.get_serializer_context(), 'level': level})
+        return Response(serializer.data)
+
+
+class RosterImportView(generics.GenericAPIView):
+    # bulk enrollment of a club roster (csv/xlsx) into a choice; ?dry_run=true validates without writing
+    serializer_class = RosterImportSerializer
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        choice = get_object_or_404(CompetitionMaps, id=self.kwargs['choice_id'])
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            report = import_roster(serializer.validated_data['file'], serializer.validated_data['sport_club'], choice,
+                                   dry_run=serializer.validated_data['dry_run'])
+        except RosterError as e:
+            return Response({'success': False, 'message': f'{e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'success': True, **report}, status=status.HTTP_200_OK)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CompetitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.competition'
+
+    def ready(self):
+        from apps.competition import signals  # noqa: F401
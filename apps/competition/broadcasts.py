@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from apps.account.api.v1.sms import get_provider
+from apps.competition.models import Broadcast, Participant
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE = ('draft', 'queued', 'failed')
+
+
+class RateLimiter:
+    """ Spaces calls 1/rate seconds apart across all threads sharing the limiter """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_call = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def recipients(broadcast, after=0):
+    """ (participant id, phone number) in participant id order, starting after the resume cursor """
+    participants = Participant.objects.filter(competition_id=broadcast.competition_id, id__gt=after) \
+        .exclude(user__phone_number__isnull=True).exclude(user__phone_number='')
+    if broadcast.choice_id:
+        participants = participants.filter(choice_id=broadcast.choice_id)
+    return participants.order_by('id').values_list('id', 'user__phone_number')
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _send(provider, limiter, batch, message, dispatch_id):
+    limiter.wait()
+    try:
+        provider.send_batch([(participant_id, phone_number, message) for participant_id, phone_number in batch],
+                            dispatch_id=dispatch_id)
+    finally:
+        # the provider may have read its token from the database in this thread
+        connection.close()
+
+
+def run_broadcast(broadcast_id, workers=None, force=False):
+    """
+    Deliver a broadcast in send-batch requests from a small thread pool. The
+    recipient query is streamed with iterator(); batches are acknowledged in
+    order, so `cursor` is always the last participant id whose batch (and every
+    batch before it) was accepted by the provider. A failed or interrupted run
+    resumes from there; the few batches that were in flight may be resent.
+    """
+    statuses = RESUMABLE + ('sending',) if force else RESUMABLE
+    claimed = Broadcast.objects.filter(id=broadcast_id, status__in=statuses) \
+        .update(status='sending', error=None, started_at=timezone.now(), finished_at=None)
+    if not claimed:
+        return False
+    broadcast = Broadcast.objects.get(id=broadcast_id)
+    if not broadcast.cursor:
+        broadcast.total = recipients(broadcast).count()
+        Broadcast.objects.filter(id=broadcast_id).update(total=broadcast.total, sent=0)
+
+    workers = workers or settings.SMS_WORKERS
+    size = settings.SMS_BATCH_SIZE
+    provider = get_provider()
+    limiter = RateLimiter(settings.SMS_BATCH_RATE)
+    inflight = deque()
+
+    def acknowledge():
+        last_id, count, future = inflight.popleft()
+        future.result()
+        Broadcast.objects.filter(id=broadcast_id).update(cursor=last_id, sent=F('sent') + count)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'broadcast-{broadcast_id}')
+    rows = recipients(broadcast, after=broadcast.cursor).iterator(chunk_size=size)
+    try:
+        for batch in batches(rows, size):
+            future = pool.submit(_send, provider, limiter, batch, broadcast.message, broadcast.id)
+            inflight.append((batch[-1][0], len(batch), future))
+            if len(inflight) > workers:
+                acknowledge()
+        while inflight:
+            acknowledge()
+    except Exception as e:
+        pool.shutdown(cancel_futures=True)
+        rows.close()
+        logger.exception('Broadcast %s failed', broadcast_id)
+        Broadcast.objects.filter(id=broadcast_id).update(status='failed', error=f'{e}')
+        return False
+    pool.shutdown()
+    Broadcast.objects.filter(id=broadcast_id).update(status='done', finished_at=timezone.now())
+    return True
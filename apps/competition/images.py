@@ -0,0 +1,19 @@
+from apps.base.images import build_field_variants
+from apps.competition.models import Competition, CompetitionMaps, HistoryImage
+
+# variant name -> longest side in pixels; cards and lists use medium, full screen views large
+PHOTO_SIZES = {'small': 320, 'medium': 768, 'large': 1600}
+# previews only, zooming in goes through the tile pyramid
+MAP_SIZES = {'small': 320, 'medium': 1024}
+
+# model -> (image field, sizes, with tile pyramid)
+IMAGE_FIELDS = {
+    Competition: ('image', PHOTO_SIZES, False),
+    HistoryImage: ('image', PHOTO_SIZES, False),
+    CompetitionMaps: ('maps', MAP_SIZES, True),
+}
+
+
+def build_image_variants(model, pk):
+    field, sizes, tiles = IMAGE_FIELDS[model]
+    return build_field_variants(model, pk, field, sizes, tiles=tiles)
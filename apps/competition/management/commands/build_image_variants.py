@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.competition.images import IMAGE_FIELDS, build_image_variants
+
+MODELS = {model._meta.model_name: model for model in IMAGE_FIELDS}
+
+
+class Command(BaseCommand):
+    help = 'Build resized variants (and map tile pyramids) for competition, history and map images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help='only these models, default all of them')
+        parser.add_argument('--all', action='store_true', help='rebuild every image, not only ones without variants')
+
+    def handle(self, *args, **options):
+        for name in options['model'] or sorted(MODELS):
+            model = MODELS[name]
+            field = IMAGE_FIELDS[model][0]
+            rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            if not options['all']:
+                rows = rows.filter(**{f'{field}_variants': {}})
+            built = failed = 0
+            for pk in rows.order_by('pk').values_list('pk', flat=True).iterator():
+                try:
+                    build_image_variants(model, pk)
+                    built += 1
+                except (OSError, ValueError) as e:
+                    # missing files and images Pillow cannot read
+                    failed += 1
+                    self.stderr.write(f'{name} {pk}: {e}')
+            self.stdout.write(self.style.SUCCESS(f'{name}: built {built}, {failed} failed'))
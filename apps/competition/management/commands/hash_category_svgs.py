@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.competition.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Fill Category.svg_hash for categories saved before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='recompute every category, not only empty ones')
+
+    def handle(self, *args, **options):
+        categories = Category.objects.exclude(svg__isnull=True).exclude(svg='')
+        if not options['all']:
+            categories = categories.filter(svg_hash__isnull=True)
+        updated = 0
+        # a handful of rows; saving one by one keeps the cached bundle and home sections in sync
+        for category in categories:
+            category.save(update_fields=['svg', 'svg_hash'])
+            updated += 1
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} categories'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.competition.rating import rate_athletes
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cross-season athlete rating from finished competitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='only add competitions finished since the last run')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        competitions, athletes = rate_athletes(incremental=options['incremental'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rated {athletes} athletes from {competitions} competitions'))
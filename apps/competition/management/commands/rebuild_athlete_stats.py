@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.competition.stats import rebuild_athlete_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the athlete personal-bests table from all participant results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_athlete_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} athlete stats rows'))
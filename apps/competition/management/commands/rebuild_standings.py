@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.competition.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Recompute club and country standings for every distance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competition', type=int, help='only this competition id')
+
+    def handle(self, *args, **options):
+        count = rebuild_standings(competition_id=options['competition'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} team standing rows'))
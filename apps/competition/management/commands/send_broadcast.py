@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.competition.broadcasts import run_broadcast
+from apps.competition.models import Broadcast
+
+
+class Command(BaseCommand):
+    help = 'Send (or resume) a broadcast to the participants of its competition'
+
+    def add_arguments(self, parser):
+        parser.add_argument('broadcast_id', type=int)
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--force', action='store_true',
+                            help='take over a broadcast left in "sending" by a crashed process')
+
+    def handle(self, *args, **options):
+        if not run_broadcast(options['broadcast_id'], workers=options['workers'], force=options['force']):
+            broadcast = Broadcast.objects.filter(id=options['broadcast_id']).first()
+            if broadcast is None:
+                raise CommandError('Broadcast not found')
+            raise CommandError(f'Broadcast is {broadcast.status}{f": {broadcast.error}" if broadcast.error else ""}')
+        broadcast = Broadcast.objects.get(id=options['broadcast_id'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {broadcast.sent} of {broadcast.total} messages'))
@@ -1,10 +1,16 @@
+import hashlib
+
 from django.utils.safestring import mark_safe
 
-from apps.account.models import Account
+from apps.account.models import Account, Country, SportClub
+from apps.base.images import variant_url
 from apps.base.models import BaseModel
 from apps.main.models import Partner
+from apps.competition.splits import pack_splits
+from apps.competition.routes import RouteError, build_route
 from datetime import datetime
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 
 STATUS = (
     ('future', 'Future'),
@@ -12,16 +18,41 @@ STATUS = (
     ('past', 'Past')
 )
 
+TEAM_KIND = (
+    ('club', 'Club'),
+    ('country', 'Country'),
+)
+
+BROADCAST_STATUS = (
+    ('draft', 'Draft'),
+    ('queued', 'Queued'),
+    ('sending', 'Sending'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
 
 class Category(BaseModel):
     title = models.CharField(max_length=223, null=True, blank=True)
     icon = models.ImageField(upload_to='categories/', null=True, blank=True)
     svg = models.TextField(null=True, blank=True)
+    # content hash of `svg`, part of its immutable URL
+    svg_hash = models.CharField(max_length=16, null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
         return f'{self.title}'
 
+    def set_svg_hash(self):
+        self.svg_hash = hashlib.sha256(self.svg.encode()).hexdigest()[:16] if self.svg else None
+
+    def save(self, *args, **kwargs):
+        self.set_svg_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'svg' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'svg_hash'}
+        super().save(*args, **kwargs)
+
 
 class Competition(BaseModel):
     status = models.CharField(choices=STATUS, null=True, blank=True, max_length=6)
@@ -30,6 +61,8 @@ class Competition(BaseModel):
     sub_title = models.CharField(max_length=223, null=True, blank=True)
     amount = models.FloatField(null=True, blank=True)
     image = models.ImageField(upload_to='competitions/', null=True, blank=True)
+    # resized copies of the image, built in the background (apps.competition.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     youtube = models.URLField(null=True, blank=True)
     media = models.FileField(upload_to='video/', null=True, blank=True)
     period = models.CharField(max_length=223, null=True, blank=True)
@@ -45,6 +78,7 @@ class Competition(BaseModel):
     end_date = models.DateField(null=True, blank=True)
     regulation_link = models.CharField(max_length=223, null=True, blank=True)
     offer_link = models.CharField(max_length=223, null=True, blank=True)
+    rated_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.title} - {self.status}"
@@ -52,8 +86,9 @@ class Competition(BaseModel):
     @property
     def image_tag(self):
         if self.image:
+            src = variant_url(self.image, self.image_variants, 'medium')
             return mark_safe(
-                f'<a href="{self.image.url}"><img src="{self.image.url}" style="height:450px; width: 600px;"/></a>')
+                f'<a href="{self.image.url}"><img src="{src}" style="height:450px; width: 600px;"/></a>')
         return 'no_image'
 
     def update_status(self):
@@ -72,11 +107,13 @@ class HistoryImage(BaseModel):
     competition = models.ForeignKey(Competition, on_delete=models.CASCADE, null=True, blank=True,
                                     related_name="history_images")
     image = models.ImageField(upload_to='history_images/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     image_url = models.URLField(null=True, blank=True)
 
     def image_tag(self):
         if self.image:
-            return mark_safe(f'<a href="{self.image.url}"><img src="{self.image.url}" style="height:50px;"/></a>')
+            src = variant_url(self.image, self.image_variants, 'small')
+            return mark_safe(f'<a href="{self.image.url}"><img src="{src}" style="height:50px;"/></a>')
         return 'no_image'
 
     def __str__(self):
@@ -87,27 +124,75 @@ class CompetitionMaps(BaseModel):
     competition = models.ForeignKey(Competition, on_delete=models.CASCADE, null=True, blank=True,
                                     related_name="competition_maps")
     maps = models.ImageField(upload_to='maps/', null=True, blank=True)
+    # resized previews and the deep zoom tile pyramid of the map
+    maps_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=223, null=True, blank=True)
 
     @property
     def set_position(self):
         qs = self.participant_choices.filter(choice_id=self.id).order_by('duration')
         counter = 0
-        for i in qs:
-            counter += 1
-            i.position = counter
-            i.save()
+        with transaction.atomic():
+            for i in qs:
+                counter += 1
+                i.position = counter
+                i.save()
         return qs
 
     def image_tag(self):
         if self.maps:
-            return mark_safe(f'<a href="{self.maps.url}"><img src="{self.maps.url}" style="height:80px;"/></a>')
+            src = variant_url(self.maps, self.maps_variants, 'small')
+            return mark_safe(f'<a href="{self.maps.url}"><img src="{src}" style="height:80px;"/></a>')
         return 'no_image'
 
     def __str__(self):
         return self.title
 
 
+class Checkpoint(BaseModel):
+    choice = models.ForeignKey(CompetitionMaps, on_delete=models.CASCADE, related_name="checkpoints")
+    title = models.CharField(max_length=223, null=True, blank=True)
+    distance = models.PositiveIntegerField(help_text='meters from the start')
+
+    class Meta:
+        ordering = ('distance',)
+        constraints = [
+            models.UniqueConstraint(fields=('choice', 'distance'), name='unique_checkpoint_distance'),
+        ]
+
+    def __str__(self):
+        return f"{self.choice} - {self.title or self.distance}"
+
+
+class CourseRoute(BaseModel):
+    choice = models.OneToOneField(CompetitionMaps, on_delete=models.CASCADE, related_name="route")
+    gpx = models.FileField(upload_to='routes/')
+    length = models.FloatField(default=0, help_text='meters')
+    points = models.PositiveIntegerField(default=0, help_text='points in the uploaded track')
+    bounds = models.JSONField(default=list, blank=True, help_text='[south, west, north, east]')
+    polylines = models.JSONField(default=dict, blank=True, help_text='encoded polyline per map zoom level')
+
+    def clean(self):
+        # forms parse the upload here, so a broken file is a form error instead of a failing save()
+        if self.gpx and not self.gpx._committed:
+            try:
+                build_route(self)
+            except RouteError as e:
+                raise ValidationError({'gpx': str(e)})
+            if not self.points:
+                raise ValidationError({'gpx': 'The file has no track or route points'})
+            self._built_from = self.gpx
+
+    def save(self, *args, **kwargs):
+        # a freshly uploaded file is not committed to storage yet: parse it once, unless clean() already did
+        if self.gpx and not self.gpx._committed and getattr(self, '_built_from', None) is not self.gpx:
+            build_route(self)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.choice} route"
+
+
 class CompetitionTexts(BaseModel):
     competition = models.ForeignKey(Competition, on_delete=models.CASCADE, null=True, blank=True,
                                     related_name="competition_texts")
@@ -136,6 +221,81 @@ class Participant(BaseModel):
     payment_status = models.CharField(max_length=20, choices=[("pending", "Pending"), ("paid", "Paid")],
                                       default="pending")
     payment_link = models.URLField(null=True, blank=True)
+    splits = models.BinaryField(null=True, blank=True, help_text='packed uint32 seconds per checkpoint')
 
     def __str__(self):
         return self.user.get_fullname()
+
+    def set_splits(self, seconds):
+        self.splits = pack_splits(seconds)
+
+
+class AthleteStats(BaseModel):
+    user = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="stats")
+    distance = models.CharField(max_length=223)
+    races = models.PositiveIntegerField(default=0)
+    best_duration = models.TimeField(null=True, blank=True)
+    best_position = models.PositiveIntegerField(null=True, blank=True)
+    total_distance = models.FloatField(default=0, help_text='kilometers')
+
+    class Meta:
+        verbose_name = "Athlete stats"
+        verbose_name_plural = "Athlete stats"
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'distance'), name='unique_athlete_stats_distance'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.distance}"
+
+
+class TeamStanding(BaseModel):
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE, related_name="team_standings")
+    choice = models.ForeignKey(CompetitionMaps, on_delete=models.CASCADE, related_name="team_standings")
+    kind = models.CharField(max_length=7, choices=TEAM_KIND)
+    sport_club = models.ForeignKey(SportClub, on_delete=models.CASCADE, null=True, blank=True)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, null=True, blank=True)
+    rank = models.PositiveIntegerField()
+    score = models.PositiveIntegerField(null=True, blank=True, help_text='sum of the top finishers positions')
+    scored = models.PositiveIntegerField(default=0)
+    finishers = models.PositiveIntegerField(default=0)
+    best_position = models.PositiveIntegerField(null=True, blank=True)
+    gold = models.PositiveIntegerField(default=0)
+    silver = models.PositiveIntegerField(default=0)
+    bronze = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('kind', 'rank')
+        indexes = [
+            models.Index(fields=('competition', 'kind', 'rank')),
+        ]
+
+    def __str__(self):
+        return f"{self.choice} - {self.sport_club or self.country} #{self.rank}"
+
+
+class AthleteRating(BaseModel):
+    user = models.OneToOneField(Account, on_delete=models.CASCADE, related_name="rating")
+    points = models.FloatField(default=0)
+    races = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user} - {self.points:.1f}"
+
+
+class Broadcast(BaseModel):
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE, related_name="broadcasts")
+    choice = models.ForeignKey(CompetitionMaps, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name="broadcasts", help_text='only this distance, all of them when empty')
+    message = models.TextField()
+    status = models.CharField(max_length=7, choices=BROADCAST_STATUS, default='draft')
+    total = models.PositiveIntegerField(default=0, editable=False)
+    sent = models.PositiveIntegerField(default=0, editable=False)
+    cursor = models.PositiveIntegerField(default=0, editable=False, help_text='last participant id delivered')
+    error = models.TextField(null=True, blank=True, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return f"{self.competition} - {self.get_status_display()} ({self.sent}/{self.total})"
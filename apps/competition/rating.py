@@ -0,0 +1,93 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.competition.models import AthleteRating, Competition, Participant
+from apps.competition.stats import distance_km
+
+
+def _load_results(competition_ids):
+    rows = Participant.objects.filter(
+        competition_id__in=competition_ids, user__isnull=False, choice__isnull=False, position__isnull=False
+    ).values_list('user_id', 'choice_id', 'position', 'choice__title')
+    user_ids, choice_ids, positions, titles = [], [], [], {}
+    for user_id, choice_id, position, title in rows.iterator(chunk_size=5000):
+        user_ids.append(user_id)
+        choice_ids.append(choice_id)
+        positions.append(position)
+        titles[choice_id] = title
+    return (np.asarray(user_ids, dtype=np.int64), np.asarray(choice_ids, dtype=np.int64),
+            np.asarray(positions, dtype=np.float64), titles)
+
+
+def result_points(choice_ids, positions, titles):
+    """
+    Points of every result: the winner of a 10 km race gets RATING_BASE_POINTS,
+    the rest scale linearly down to the last finisher, and the distance weight
+    is sqrt(km / 10) kept between 0.5 and 2.
+    """
+    choices, inverse, field_sizes = np.unique(choice_ids, return_inverse=True, return_counts=True)
+    km = np.asarray([distance_km(titles[choice_id]) or 10 for choice_id in choices], dtype=np.float64)
+    weights = np.clip(np.sqrt(km / 10), 0.5, 2.0)
+    field = field_sizes[inverse].astype(np.float64)
+    placed = np.clip(positions, 1, field)
+    return settings.RATING_BASE_POINTS * (field - placed + 1) / field * weights[inverse]
+
+
+def _user_totals(competition_ids):
+    user_ids, choice_ids, positions, titles = _load_results(competition_ids)
+    if not len(user_ids):
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+    points = result_points(choice_ids, positions, titles)
+    users, inverse = np.unique(user_ids, return_inverse=True)
+    return users, np.bincount(inverse, weights=points), np.bincount(inverse)
+
+
+def _update_ranks(batch_size):
+    rows = list(AthleteRating.objects.values_list('id', 'points', 'rank'))
+    if not rows:
+        return
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    points = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    current = np.fromiter((row[2] or 0 for row in rows), dtype=np.int64, count=len(rows))
+    order = np.lexsort((ids, -points))
+    ranks = np.empty(len(ids), dtype=np.int64)
+    ranks[order] = np.arange(1, len(ids) + 1)
+    changed = np.nonzero(ranks != current)[0]
+    AthleteRating.objects.bulk_update(
+        [AthleteRating(id=int(ids[i]), rank=int(ranks[i])) for i in changed], ['rank'], batch_size=batch_size
+    )
+
+
+def rate_athletes(incremental=False, batch_size=1000):
+    """
+    Full mode rates every finished competition from scratch. Incremental mode
+    only adds the points of competitions finished since the last run.
+    """
+    competitions = Competition.objects.filter(status='past')
+    if incremental:
+        competitions = competitions.filter(rated_at__isnull=True)
+    competition_ids = list(competitions.values_list('id', flat=True))
+    users, points, races = _user_totals(competition_ids)
+
+    with transaction.atomic():
+        if incremental:
+            existing = AthleteRating.objects.in_bulk(users.tolist(), field_name='user_id')
+        else:
+            AthleteRating.objects.all().delete()
+            existing = {}
+        to_create, to_update = [], []
+        for user_id, user_points, user_races in zip(users.tolist(), points.tolist(), races.tolist()):
+            rating = existing.get(user_id)
+            if rating is None:
+                to_create.append(AthleteRating(user_id=user_id, points=user_points, races=user_races))
+                continue
+            rating.points += user_points
+            rating.races += user_races
+            to_update.append(rating)
+        AthleteRating.objects.bulk_create(to_create, batch_size=batch_size)
+        AthleteRating.objects.bulk_update(to_update, ['points', 'races'], batch_size=batch_size)
+        _update_ranks(batch_size)
+        Competition.objects.filter(id__in=competition_ids).update(rated_at=timezone.now())
+    return len(competition_ids), len(users)
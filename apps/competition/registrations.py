@@ -0,0 +1,188 @@
+import io
+import os
+
+import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from apps.account.models import GENDER, SIZE, Account, Country, phone_regex
+from apps.competition.models import Competition, Participant
+from apps.main.home import touch_sections
+
+# accepted headers (case-insensitive) -> Account / Participant field, the export's column names work too
+COLUMNS = {
+    'phone': 'phone_number',
+    'phone_number': 'phone_number',
+    'name': 'first_name',
+    'first_name': 'first_name',
+    'surname': 'last_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'birthday': 'birthday',
+    'gender': 'gender',
+    'size': 'size',
+    'country': 'country',
+    'bib': 'personal_id',
+    'distance': 'distance',
+}
+REQUIRED = ('phone_number', 'first_name', 'last_name')
+GENDERS = {value for value, _ in GENDER}
+SIZES = {value for value, _ in SIZE}
+
+
+class RosterError(Exception):
+    """ The file as a whole cannot be imported: unreadable, missing columns or over capacity """
+
+
+def read_roster(file):
+    name = os.path.splitext(getattr(file, 'name', '') or '')[1].lower()
+    try:
+        if name in ('.xlsx', '.xls'):
+            frame = pd.read_excel(file, dtype=str)
+        else:
+            # utf-8-sig: Excel saves CSV with a BOM; sep=None sniffs comma or semicolon
+            frame = pd.read_csv(io.StringIO(file.read().decode('utf-8-sig')), dtype=str, sep=None, engine='python')
+    except Exception as e:
+        raise RosterError(f'Could not read the file: {e}')
+    frame = frame.rename(columns=lambda column: COLUMNS.get(str(column).strip().lower().replace(' ', '_')))
+    frame = frame.loc[:, frame.columns.notna()]
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    missing = [column for column in REQUIRED if column not in frame.columns]
+    if missing:
+        raise RosterError(f'Missing columns: {", ".join(missing)}')
+    frame = frame.apply(lambda column: column.str.strip())
+    return frame.astype(object).where(frame.notna() & (frame != ''), None)
+
+
+def _clean_row(row, countries):
+    errors = {}
+    data = {}
+    for field in REQUIRED:
+        if not row.get(field):
+            errors[field] = 'This field is required.'
+    phone_number = (row.get('phone_number') or '').replace(' ', '')
+    if phone_number:
+        if not phone_number.startswith('+') and phone_number.isdigit():
+            phone_number = f'+{phone_number}'
+        try:
+            phone_regex(phone_number)
+        except ValidationError as e:
+            errors['phone_number'] = e.messages[0]
+    data['phone_number'] = phone_number
+    data['first_name'] = row.get('first_name')
+    data['last_name'] = row.get('last_name')
+
+    email = row.get('email')
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError as e:
+            errors['email'] = e.messages[0]
+    data['email'] = email.lower() if email else None
+
+    if row.get('birthday'):
+        birthday = pd.to_datetime(row['birthday'], errors='coerce', dayfirst=True)
+        if pd.isna(birthday):
+            errors['birthday'] = 'Invalid date.'
+        else:
+            data['birthday'] = birthday.date()
+    for field, choices in (('gender', GENDERS), ('size', SIZES)):
+        value = (row.get(field) or '').lower()
+        if value and value not in choices:
+            errors[field] = f'Must be one of: {", ".join(sorted(choices))}.'
+        elif value:
+            data[field] = value
+    if row.get('country'):
+        country_id = countries.get(row['country'].casefold())
+        if country_id is None:
+            errors['country'] = f'Unknown country "{row["country"]}".'
+        data['country_id'] = country_id
+    data['personal_id'] = row.get('personal_id')
+    data['distance'] = row.get('distance')
+    return data, errors
+
+
+def import_roster(file, sport_club, choice, dry_run=False):
+    """
+    Create or match the accounts of a club roster and enroll them in `choice`.
+    Valid rows are imported, invalid ones come back in report['errors'] with the
+    spreadsheet row number. New accounts get an unusable password (no hashing,
+    no SMS); the runner claims the account by registering the phone number.
+    """
+    frame = read_roster(file)
+    countries = {name.casefold(): pk for pk, name in Country.objects.values_list('id', 'name') if name}
+    errors = []
+    rows = {}
+    for number, row in enumerate(frame.to_dict('records'), start=2):
+        data, row_errors = _clean_row(row, countries)
+        if not row_errors and data['phone_number'] in rows:
+            row_errors['phone_number'] = f'Duplicate of row {rows[data["phone_number"]][0]}.'
+        if row_errors:
+            errors.append({'row': number, 'phone_number': data['phone_number'], 'errors': row_errors})
+        else:
+            rows[data['phone_number']] = (number, data)
+
+    existing = dict(Account.objects.filter(phone_number__in=rows).values_list('phone_number', 'id'))
+    emails = {}
+    for phone, (number, data) in list(rows.items()):
+        email = data['email']
+        if not email or phone in existing:
+            continue
+        if email in emails:
+            # the second new account with this email would fail the unique constraint
+            rows.pop(phone)
+            errors.append({'row': number, 'phone_number': phone,
+                           'errors': {'email': f'Duplicate of row {rows[emails[email]][0]}.'}})
+        else:
+            emails[email] = phone
+    taken = set(Account.objects.filter(email__in=emails).values_list('email', flat=True))
+    for email in taken:
+        number, data = rows.pop(emails[email])
+        errors.append({'row': number, 'phone_number': data['phone_number'],
+                       'errors': {'email': 'An account with this email already exists.'}})
+
+    report = {'rows': len(frame), 'created': 0, 'matched': 0, 'enrolled': 0, 'already_enrolled': 0,
+              'errors': sorted(errors, key=lambda error: error['row'])}
+    if not rows:
+        return report
+
+    with transaction.atomic():
+        # the lock serializes concurrent imports and joins against the same capacity
+        competition = Competition.objects.select_for_update().get(id=choice.competition_id)
+        enrolled = set(Participant.objects.filter(competition=competition, user_id__in=existing.values())
+                       .values_list('user_id', flat=True))
+        joining = [phone for phone in rows if existing.get(phone) not in enrolled]
+        if competition.members is not None:
+            free = competition.members - competition.competition_participants.count()
+            if len(joining) > free:
+                raise RosterError(f'Not enough places: {len(joining)} runners to enroll, {max(free, 0)} left.')
+
+        new = [phone for phone in joining if phone not in existing]
+        password = make_password(None)
+        accounts = [
+            Account(sport_club=sport_club, password=password,
+                    **{field: value for field, value in rows[phone][1].items()
+                       if field not in ('personal_id', 'distance') and value is not None})
+            for phone in new
+        ]
+        for account in accounts:
+            # bulk_create skips Account.save()
+            account.set_search_name()
+        Account.objects.bulk_create(accounts, batch_size=500)
+        ids = {**existing, **dict(Account.objects.filter(phone_number__in=new).values_list('phone_number', 'id'))}
+        Participant.objects.bulk_create([
+            Participant(user_id=ids[phone], competition=competition, choice=choice,
+                        personal_id=rows[phone][1]['personal_id'],
+                        distance=rows[phone][1]['distance'] or choice.title)
+            for phone in joining
+        ], batch_size=500)
+        # bulk_create sends no post_save, so the participant signals never see these rows
+        touch_sections('present')
+        if dry_run:
+            transaction.set_rollback(True)
+
+    report.update(created=len(new), matched=len(rows) - len(new), enrolled=len(joining),
+                  already_enrolled=len(rows) - len(joining))
+    return report
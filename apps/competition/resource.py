@@ -1,6 +1,8 @@
 from import_export import resources
 from import_export.fields import Field
 from .models import Participant
+from .splits import unpack_splits
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 from datetime import timedelta
 
@@ -19,12 +21,17 @@ class ParticipantResource(resources.ModelResource):
     city = Field(attribute='user__city__name', column_name='City')
     size = Field(attribute='user__size', column_name='Size')
     id = Field(attribute='user_id', column_name='ID')
+    splits = Field(column_name='Splits')
 
     class Meta:
         model = Participant
         fields = (
             'bib', 'tag', 'position', 'time', 'distance', 'name', 'surname', 'birthday', 'gender', 'country',
-            'city', 'size', 'id')
+            'city', 'size', 'id', 'splits')
+
+    def dehydrate_splits(self, participant):
+        # elapsed seconds at each checkpoint, e.g. "1520;3075;"
+        return ';'.join('' if value is None else str(value) for value in unpack_splits(participant.splits))
 
     def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
         """
@@ -32,7 +39,7 @@ class ParticipantResource(resources.ModelResource):
         Manually removing commit hooks for intermediate save_points of atomic transaction
         """
 
-        for data in dataset:
+        for number, data in enumerate(dataset, start=1):
             model = get_object_or_404(Participant, id=data[12])
             duration_str = data[4]
             position_str = data[2]
@@ -42,7 +49,14 @@ class ParticipantResource(resources.ModelResource):
                 model.position = position_numeric
                 model.personal_id = data[0]
                 model.duration = timedelta(seconds=float(duration_str))
+                if len(data) > 13 and data[13]:
+                    model.set_splits(value or None for value in str(data[13]).split(';'))
             except ValueError:
                 pass
+            except OverflowError:
+                # a time too large for timedelta, the rest of the file still imports
+                result.append_invalid_row(number, dict(zip(dataset.headers, data)),
+                                          ValidationError({'time': f'Time out of range: {duration_str}'}))
+                continue
 
             model.save()
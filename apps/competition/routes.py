@@ -0,0 +1,137 @@
+import math
+
+import numpy as np
+from defusedxml import DefusedXmlException, ElementTree
+
+EARTH_RADIUS = 6371008.8
+# meters per pixel at zoom 0 on the equator for 256px web mercator tiles
+ZOOM0_RESOLUTION = 156543.03392
+# detail levels stored per route, as map zoom levels
+ROUTE_ZOOM_LEVELS = (10, 12, 14, 16)
+MAX_ZOOM = 20
+
+
+class RouteError(ValueError):
+    pass
+
+
+def parse_gpx(file):
+    """ Track points (or route points) of a GPX file as an (n, 2) array of lat, lon """
+    points = []
+    try:
+        for _, element in ElementTree.iterparse(file):
+            tag = element.tag.rsplit('}', 1)[-1]
+            if tag in ('trkpt', 'rtept'):
+                points.append((float(element.get('lat')), float(element.get('lon'))))
+            element.clear()
+    except (ElementTree.ParseError, DefusedXmlException) as e:
+        raise RouteError(f'Not a valid GPX file: {e}')
+    except (TypeError, ValueError):
+        raise RouteError(f'Track point {len(points) + 1} has no valid lat/lon')
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+def _to_meters(latlon):
+    # equirectangular projection around the route's mean latitude; plenty for a race course
+    lat0 = math.radians(latlon[:, 0].mean())
+    radians = np.radians(latlon)
+    return np.column_stack((radians[:, 1] * math.cos(lat0), radians[:, 0])) * EARTH_RADIUS
+
+
+def track_length(latlon):
+    if len(latlon) < 2:
+        return 0.0
+    lat, lon = np.radians(latlon[:, 0]), np.radians(latlon[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return float(2 * EARTH_RADIUS * np.arcsin(np.sqrt(a)).sum())
+
+
+def douglas_peucker(xy, tolerance):
+    """ Boolean mask of the points kept by Douglas-Peucker, tolerance in the units of xy """
+    keep = np.zeros(len(xy), dtype=bool)
+    if len(xy) < 3:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        inner = xy[first + 1:last]
+        segment = end - start
+        norm = math.hypot(segment[0], segment[1])
+        if norm == 0:
+            distances = np.hypot(*(inner - start).T)
+        else:
+            distances = np.abs(segment[0] * (inner[:, 1] - start[1]) - segment[1] * (inner[:, 0] - start[0])) / norm
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def encode_polyline(latlon, precision=5):
+    """ Google encoded polyline algorithm format """
+    factor = 10 ** precision
+    values = np.round(latlon * factor).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=[[0, 0]]).ravel()
+    chunks = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def zoom_tolerance(zoom, latitude):
+    """ Size of one screen pixel in meters at the given zoom level """
+    return ZOOM0_RESOLUTION * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def viewport_zoom(bounds, width):
+    """ Zoom level at which `bounds` ([south, west, north, east]) fills `width` pixels """
+    south, west, north, east = bounds
+    latitude = (south + north) / 2
+    span = math.radians(abs(east - west)) * math.cos(math.radians(latitude)) * EARTH_RADIUS
+    if span <= 0 or width <= 0:
+        return MAX_ZOOM
+    resolution = span / width
+    return max(0, min(MAX_ZOOM, math.log2(ZOOM0_RESOLUTION * math.cos(math.radians(latitude)) / resolution)))
+
+
+def pick_level(polylines, zoom):
+    """ The most detailed stored level that is not finer than the requested zoom """
+    levels = sorted(int(level) for level in polylines)
+    if not levels:
+        return None
+    suitable = [level for level in levels if level <= zoom]
+    return suitable[-1] if suitable else levels[0]
+
+
+def build_route(route):
+    route.gpx.open('rb')
+    try:
+        latlon = parse_gpx(route.gpx)
+    finally:
+        route.gpx.seek(0)
+    route.points = len(latlon)
+    if not len(latlon):
+        route.length, route.bounds, route.polylines = 0, [], {}
+        return route
+    xy = _to_meters(latlon)
+    latitude = float(latlon[:, 0].mean())
+    route.length = track_length(latlon)
+    route.bounds = [float(latlon[:, 0].min()), float(latlon[:, 1].min()),
+                    float(latlon[:, 0].max()), float(latlon[:, 1].max())]
+    route.polylines = {
+        str(zoom): encode_polyline(latlon[douglas_peucker(xy, zoom_tolerance(zoom, latitude))])
+        for zoom in ROUTE_ZOOM_LEVELS
+    }
+    return route
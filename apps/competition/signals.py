@@ -0,0 +1,90 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.base.images import DEFERRED, delete_variants, image_changed, loaded_name
+from apps.base.tasks import run_in_background
+from apps.competition.images import IMAGE_FIELDS, build_image_variants
+from apps.competition.models import Competition, CompetitionMaps, HistoryImage, Participant
+from apps.competition.standings import schedule_standings
+from apps.competition.stats import refresh_athlete_stats
+
+RESULT_FIELDS = ('user_id', 'choice_id', 'duration', 'position')
+
+
+def _result_snapshot(instance):
+    # read from __dict__: getattr on a deferred field would query once per field and row
+    return tuple(instance.__dict__.get(field, DEFERRED) for field in RESULT_FIELDS)
+
+
+def _distance_title(choice_id):
+    if not choice_id:
+        return None
+    return CompetitionMaps.objects.filter(id=choice_id).values_list('title', flat=True).first()
+
+
+@receiver(post_init, sender=Participant)
+def remember_participant_result(sender, instance, **kwargs):
+    instance._result_snapshot = _result_snapshot(instance)
+
+
+@receiver(post_save, sender=Participant)
+def update_stats_on_result_change(sender, instance, created, **kwargs):
+    previous = instance._result_snapshot
+    current = _result_snapshot(instance)
+    instance._result_snapshot = current
+    # a field that was not loaded before the save may have changed, assume it did
+    if not created and DEFERRED not in previous and previous == current:
+        return
+    refresh_athlete_stats(instance.user_id, _distance_title(instance.choice_id))
+    schedule_standings(instance.choice_id)
+    old_user_id, old_choice_id = previous[0], previous[1]
+    if (not created and DEFERRED not in (old_user_id, old_choice_id)
+            and (old_user_id, old_choice_id) != (instance.user_id, instance.choice_id)):
+        refresh_athlete_stats(old_user_id, _distance_title(old_choice_id))
+        schedule_standings(old_choice_id)
+
+
+@receiver(post_delete, sender=Participant)
+def update_stats_on_result_delete(sender, instance, **kwargs):
+    refresh_athlete_stats(instance.user_id, _distance_title(instance.choice_id))
+    schedule_standings(instance.choice_id)
+
+
+@receiver(post_init, sender=Competition)
+@receiver(post_init, sender=HistoryImage)
+@receiver(post_init, sender=CompetitionMaps)
+def remember_image(sender, instance, **kwargs):
+    instance._image_name = loaded_name(instance, IMAGE_FIELDS[sender][0])
+
+
+@receiver(post_save, sender=Competition)
+@receiver(post_save, sender=HistoryImage)
+@receiver(post_save, sender=CompetitionMaps)
+def schedule_image_variants(sender, instance, created, update_fields, **kwargs):
+    field = IMAGE_FIELDS[sender][0]
+    previous, current = instance._image_name, loaded_name(instance, field)
+    instance._image_name = current
+    if not image_changed(previous, current, created, update_fields, field):
+        return
+    variants_field = f'{field}_variants'
+    variants = getattr(instance, variants_field)
+    if variants:
+        # the old sizes belong to the old picture
+        setattr(instance, variants_field, {})
+        sender.objects.filter(pk=instance.pk).update(**{variants_field: {}})
+    if previous or variants:
+        run_in_background(delete_variants, sender._meta.get_field(field).storage,
+                          None if previous is DEFERRED else previous, variants)
+    if current and current is not DEFERRED:
+        run_in_background(build_image_variants, sender, instance.pk)
+
+
+@receiver(pre_delete, sender=Competition)
+@receiver(pre_delete, sender=HistoryImage)
+@receiver(pre_delete, sender=CompetitionMaps)
+def delete_image_variants(sender, instance, **kwargs):
+    # before the row goes, a deferred image can still be read; the files go after commit
+    field = IMAGE_FIELDS[sender][0]
+    field_file, variants = getattr(instance, field), getattr(instance, f'{field}_variants')
+    if field_file or variants:
+        run_in_background(delete_variants, field_file.storage, field_file.name, variants)
@@ -0,0 +1,102 @@
+import threading
+from functools import partial
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from apps.competition.models import CompetitionMaps, Participant, TeamStanding
+
+# distances waiting for a commit, per thread (each thread has its own connection)
+_pending = threading.local()
+
+TEAM_COLUMNS = {
+    'club': 'sport_club_id',
+    'country': 'country_id',
+}
+
+
+def _team_rows(frame, column, scoring_size):
+    frame = frame.dropna(subset=[column]).sort_values('position')
+    if frame.empty:
+        return []
+    grouped = frame.groupby(column)['position']
+    top = frame.groupby(column).head(scoring_size).groupby(column)['position']
+    table = pd.DataFrame({
+        'finishers': grouped.size(),
+        'best_position': grouped.min(),
+        'gold': grouped.agg(lambda positions: (positions == 1).sum()),
+        'silver': grouped.agg(lambda positions: (positions == 2).sum()),
+        'bronze': grouped.agg(lambda positions: (positions == 3).sum()),
+        'scored': top.size(),
+        'score': top.sum(),
+    })
+    # incomplete teams can't be scored against full ones, they go to the bottom
+    table['complete'] = table['scored'] >= scoring_size
+    table = table.sort_values(['complete', 'score', 'best_position'], ascending=[False, True, True])
+    rows = []
+    for rank, (team_id, row) in enumerate(table.iterrows(), start=1):
+        rows.append({
+            column: int(team_id),
+            'rank': rank,
+            'score': int(row['score']) if row['complete'] else None,
+            'scored': int(row['scored']),
+            'finishers': int(row['finishers']),
+            'best_position': int(row['best_position']),
+            'gold': int(row['gold']),
+            'silver': int(row['silver']),
+            'bronze': int(row['bronze']),
+        })
+    return rows
+
+
+def compute_standings(choice_id):
+    """ Recompute club and country standings of one distance in a single pandas pass """
+    choice = CompetitionMaps.objects.filter(id=choice_id).only('id', 'competition_id').first()
+    if not choice:
+        return 0
+    results = Participant.objects.filter(choice_id=choice_id, duration__isnull=False, position__isnull=False) \
+        .values_list('user__sport_club_id', 'user__country_id', 'position')
+    frame = pd.DataFrame.from_records(list(results), columns=['sport_club_id', 'country_id', 'position'])
+    objs = []
+    for kind, column in TEAM_COLUMNS.items():
+        for row in _team_rows(frame, column, settings.TEAM_SCORING_SIZE):
+            objs.append(TeamStanding(competition_id=choice.competition_id, choice_id=choice.id, kind=kind, **row))
+    with transaction.atomic():
+        TeamStanding.objects.filter(choice_id=choice_id).delete()
+        TeamStanding.objects.bulk_create(objs)
+    return len(objs)
+
+
+def _pending_ids():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    return _pending.ids
+
+
+def _run_pending(choice_id):
+    pending = _pending_ids()
+    if choice_id in pending:
+        pending.discard(choice_id)
+        compute_standings(choice_id)
+
+
+def schedule_standings(choice_id):
+    """
+    Recompute a distance once the current transaction commits. Bulk position
+    updates (set_position, result imports) save every participant; the first
+    callback that runs for a distance computes it and the repeats find it no
+    longer pending. After a rollback the id stays pending, the next commit
+    that schedules it computes it.
+    """
+    if not choice_id:
+        return
+    _pending_ids().add(choice_id)
+    transaction.on_commit(partial(_run_pending, choice_id))
+
+
+def rebuild_standings(competition_id=None):
+    choices = CompetitionMaps.objects.all()
+    if competition_id:
+        choices = choices.filter(competition_id=competition_id)
+    return sum(compute_standings(choice_id) for choice_id in choices.values_list('id', flat=True))
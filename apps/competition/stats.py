@@ -0,0 +1,81 @@
+import re
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+from apps.competition.models import AthleteStats, Participant
+
+DISTANCE_ALIASES = {
+    'half marathon': 21.0975,
+    'half': 21.0975,
+    'marathon': 42.195,
+}
+DISTANCE_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(km|k|m)?\b', re.IGNORECASE)
+FINISHED = Q(duration__isnull=False)
+
+
+def distance_km(label):
+    """ '10 km' -> 10.0, '5K' -> 5.0, '800m' -> 0.8, 'Half marathon' -> 21.0975 """
+    if not label:
+        return 0
+    lowered = label.lower()
+    for alias, km in DISTANCE_ALIASES.items():
+        if alias in lowered:
+            return km
+    match = DISTANCE_RE.search(lowered)
+    if not match:
+        return 0
+    value = float(match.group(1).replace(',', '.'))
+    if (match.group(2) or '').lower() == 'm':
+        return value / 1000
+    return value
+
+
+STATS_AGGREGATES = {
+    'races': Count('id'),
+    'best_duration': Min('duration'),
+    'best_position': Min('position'),
+}
+
+
+def refresh_athlete_stats(user_id, distance):
+    """
+    Recompute a single (user, distance) row from that user's results only.
+    Called from the participant signals, so profile reads never aggregate.
+    """
+    if not user_id or not distance:
+        return None
+    row = Participant.objects.filter(FINISHED, user_id=user_id, choice__title=distance).aggregate(**STATS_AGGREGATES)
+    if not row['races']:
+        AthleteStats.objects.filter(user_id=user_id, distance=distance).delete()
+        return None
+    stats, _ = AthleteStats.objects.update_or_create(
+        user_id=user_id, distance=distance,
+        defaults={
+            'races': row['races'],
+            'best_duration': row['best_duration'],
+            'best_position': row['best_position'],
+            'total_distance': row['races'] * distance_km(distance),
+        }
+    )
+    return stats
+
+
+def rebuild_athlete_stats(batch_size=1000):
+    rows = Participant.objects.filter(FINISHED, user__isnull=False, choice__title__isnull=False).values(
+        'user_id', 'choice__title').annotate(**STATS_AGGREGATES).order_by()
+    objs = [
+        AthleteStats(
+            user_id=row['user_id'],
+            distance=row['choice__title'],
+            races=row['races'],
+            best_duration=row['best_duration'],
+            best_position=row['best_position'],
+            total_distance=row['races'] * distance_km(row['choice__title']),
+        )
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        AthleteStats.objects.all().delete()
+        AthleteStats.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
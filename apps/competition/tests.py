@@ -1,3 +1,341 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import tablib
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from import_export.results import Result
+from PIL import Image
+
+from apps.account.models import Account, SportClub
+from apps.competition.models import AthleteRating, AthleteStats, Category, Competition, CompetitionMaps, \
+    CourseRoute, Participant, TeamStanding
+from apps.competition.rating import rate_athletes, result_points
+from apps.competition.registrations import import_roster
+from apps.competition.resource import ParticipantResource
+from apps.competition.routes import ROUTE_ZOOM_LEVELS, _to_meters, douglas_peucker, encode_polyline, \
+    zoom_tolerance
+from apps.competition.splits import field_summary, pack_splits, segment_paces, split_matrix, to_seconds, \
+    unpack_splits
+from apps.competition.standings import _team_rows, compute_standings
+from apps.competition.stats import distance_km, refresh_athlete_stats
+from apps.main.home import section_tokens
+
+
+def derived_files(root):
+    # originals are django_cleanup's
+    return {os.path.relpath(os.path.join(path, name), root) for path, _, names in os.walk(root) for name in names
+            if os.path.relpath(path, root) != 'maps'}
+
+
+def png(name, size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def make_account(number, **kwargs):
+    return Account.objects.create_user(phone_number=f'+99890{number:07d}', **kwargs)
+
+
+def decode_polyline(encoded, precision=5):
+    values, value, shift = [], 0, 0
+    for char in encoded:
+        chunk = ord(char) - 63
+        value |= (chunk & 0x1f) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    return np.cumsum(np.asarray(values).reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def gpx(points, tag='trkpt'):
+    body = ''.join(f'<{tag} lat="{lat}" lon="{lon}"/>' for lat, lon in points)
+    return f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>{body}</trkseg></trk></gpx>'.encode()
+
+
+def segment_distances(points, path):
+    """ Distance of every point to the closest segment of `path` """
+    start, end = path[:-1], path[1:]
+    segment = end - start
+    lengths = np.maximum((segment ** 2).sum(axis=1), 1e-12)
+    offset = points[:, None, :] - start[None, :, :]
+    t = np.clip((offset * segment[None]).sum(axis=2) / lengths, 0, 1)
+    closest = start[None] + t[..., None] * segment[None]
+    return np.hypot(*(points[:, None, :] - closest).transpose(2, 0, 1)).min(axis=1)
+
+
+class SplitsTest(SimpleTestCase):
+    def test_to_seconds(self):
+        self.assertEqual(to_seconds('25:20'), 1520)
+        self.assertEqual(to_seconds('0:25:20'), 1520)
+        self.assertEqual(to_seconds('1520'), 1520)
+        self.assertEqual(to_seconds(1520.7), 1520)
+        self.assertIsNone(to_seconds(''))
+        self.assertIsNone(to_seconds(None))
+
+    def test_pack_round_trip(self):
+        blob = pack_splits([1520, None, '1:00:00'])
+        self.assertEqual(len(blob), 12)
+        self.assertEqual(unpack_splits(blob), [1520, None, 3600])
+
+    def test_split_matrix_pads_missing_checkpoints(self):
+        matrix = split_matrix([pack_splits([300]), None], 2)
+        self.assertEqual(matrix.shape, (2, 2))
+        self.assertEqual(matrix[0, 0], 300)
+        self.assertTrue(np.isnan(matrix[0, 1]))
+        self.assertTrue(np.isnan(matrix[1]).all())
+
+    def test_segment_paces(self):
+        matrix = np.array([[300.0, 900.0], [360.0, np.nan]])
+        paces = segment_paces(matrix, [1000, 3000])
+        np.testing.assert_array_equal(paces[0], [300, 300])
+        self.assertEqual(paces[1, 0], 360)
+        self.assertTrue(np.isnan(paces[1, 1]))
+
+    def test_field_summary(self):
+        matrix = np.array([[100.0, np.nan], [200.0, 400.0], [300.0, 600.0]])
+        self.assertEqual(field_summary(matrix), ([100.0, 400.0], [200.0, 500.0]))
+        self.assertEqual(field_summary(np.empty((0, 2))), ([None, None], [None, None]))
+
+
+class RouteTest(SimpleTestCase):
+    def test_encode_polyline(self):
+        # the example from the format's documentation
+        latlon = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+        encoded = encode_polyline(latlon)
+        self.assertEqual(encoded, '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        np.testing.assert_allclose(decode_polyline(encoded), latlon)
+
+    def test_polyline_round_trip(self):
+        latlon = np.array([[41.31108, 69.27973], [41.31012, 69.28105], [41.30876, 69.28412], [41.31108, 69.27973]])
+        np.testing.assert_allclose(decode_polyline(encode_polyline(latlon)), latlon)
+
+    def test_simplification_stays_within_each_level_tolerance(self):
+        steps = np.arange(400)
+        latlon = np.column_stack((41.3 + steps * 1e-4, 69.2 + np.sin(steps / 7) * 2e-3 + (steps % 3) * 1e-5))
+        xy = _to_meters(latlon)
+        kept = []
+        for zoom in ROUTE_ZOOM_LEVELS:
+            tolerance = zoom_tolerance(zoom, float(latlon[:, 0].mean()))
+            keep = douglas_peucker(xy, tolerance)
+            self.assertTrue(keep[0] and keep[-1])
+            self.assertLessEqual(segment_distances(xy, xy[keep]).max(), tolerance + 1e-6)
+            kept.append(keep.sum())
+        # finer zoom levels keep more of the track
+        self.assertEqual(kept, sorted(kept))
+        self.assertLess(kept[0], len(latlon))
+
+    def test_short_tracks_are_kept(self):
+        self.assertTrue(douglas_peucker(np.zeros((2, 2)), 10).all())
+
+    def test_clean_builds_the_route(self):
+        route = CourseRoute(gpx=SimpleUploadedFile('course.gpx', gpx([(41.3, 69.2), (41.31, 69.2), (41.31, 69.21)])))
+        route.clean()
+        self.assertEqual(route.points, 3)
+        self.assertEqual(route.bounds, [41.3, 69.2, 41.31, 69.21])
+        self.assertEqual(set(route.polylines), {str(zoom) for zoom in ROUTE_ZOOM_LEVELS})
+        self.assertAlmostEqual(route.length, 1112 + 834, delta=5)
+
+    def test_malformed_gpx_is_a_validation_error(self):
+        for content in (b'<gpx><trk>', b'not xml at all', gpx([(41.3, 'east')]), gpx([])):
+            with self.subTest(content=content), self.assertRaises(ValidationError) as raised:
+                CourseRoute(gpx=SimpleUploadedFile('course.gpx', content)).clean()
+            self.assertIn('gpx', raised.exception.message_dict)
+
+
+class DistanceTest(SimpleTestCase):
+    def test_distance_km(self):
+        self.assertEqual(distance_km('10 km'), 10)
+        self.assertEqual(distance_km('5K'), 5)
+        self.assertEqual(distance_km('800m'), 0.8)
+        self.assertEqual(distance_km('2,5 km'), 2.5)
+        self.assertEqual(distance_km('Half marathon'), 21.0975)
+        self.assertEqual(distance_km('Marathon'), 42.195)
+        self.assertEqual(distance_km('Fun run'), 0)
+        self.assertEqual(distance_km(None), 0)
+
+
+@override_settings(RATING_BASE_POINTS=100)
+class ResultPointsTest(SimpleTestCase):
+    def test_points_scale_with_place_and_distance(self):
+        titles = {1: '10 km', 2: '40 km', 3: '1 km'}
+        points = result_points(np.array([1, 1, 1, 1, 2, 3]), np.array([1.0, 2, 3, 4, 1, 1]), titles)
+        # 10 km: linear over a field of 4; 40 km: weight sqrt(4) = 2; 1 km: weight clipped to 0.5
+        np.testing.assert_allclose(points, [100, 75, 50, 25, 200, 50])
+
+    def test_positions_past_the_field_score_like_the_last_finisher(self):
+        points = result_points(np.array([1, 1]), np.array([1.0, 7]), {1: '10 km'})
+        np.testing.assert_allclose(points, [100, 50])
+
+
+class TeamRowsTest(SimpleTestCase):
+    def test_score_is_the_sum_of_the_top_positions(self):
+        frame = pd.DataFrame({
+            'sport_club_id': [1, 2, 2, 1, 1, 2, 3, 1, None],
+            'position': [1, 2, 3, 4, 5, 6, 7, 9, 8],
+        })
+        rows = _team_rows(frame, 'sport_club_id', 3)
+        self.assertEqual([row['sport_club_id'] for row in rows], [1, 2, 3])
+        first, second, third = rows
+        self.assertEqual((first['rank'], first['score'], first['scored'], first['finishers']), (1, 10, 3, 4))
+        self.assertEqual((first['gold'], first['silver'], first['bronze']), (1, 0, 0))
+        self.assertEqual((second['rank'], second['score'], second['best_position']), (2, 11, 2))
+        self.assertEqual((second['silver'], second['bronze']), (1, 1))
+        # too few finishers to score, ranked after the complete teams
+        self.assertEqual((third['rank'], third['score'], third['scored']), (3, None, 1))
+
+    def test_no_finishers(self):
+        frame = pd.DataFrame({'sport_club_id': [None], 'position': [1]})
+        self.assertEqual(_team_rows(frame, 'sport_club_id', 3), [])
+
+
+class StatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_account(1)
+        competition = Competition.objects.create(title='Spring run', status='past')
+        cls.choice = CompetitionMaps.objects.create(competition=competition, title='10 km')
+        for position, duration in ((3, time(0, 45)), (1, time(0, 42)), (None, None)):
+            Participant.objects.create(user=cls.user, competition=competition, choice=cls.choice,
+                                       position=position, duration=duration)
+
+    def test_refresh_athlete_stats(self):
+        AthleteStats.objects.all().delete()
+        stats = refresh_athlete_stats(self.user.id, '10 km')
+        self.assertEqual((stats.races, stats.best_duration, stats.best_position), (2, time(0, 42), 1))
+        self.assertEqual(stats.total_distance, 20)
+
+    def test_no_finished_results_drops_the_row(self):
+        Participant.objects.filter(user=self.user).update(duration=None)
+        self.assertIsNone(refresh_athlete_stats(self.user.id, '10 km'))
+        self.assertFalse(AthleteStats.objects.filter(user=self.user).exists())
+
+
+class StandingsTest(TestCase):
+    @override_settings(TEAM_SCORING_SIZE=2)
+    def test_compute_standings(self):
+        red, blue = SportClub.objects.create(name='Red'), SportClub.objects.create(name='Blue')
+        competition = Competition.objects.create(title='City run', status='past')
+        choice = CompetitionMaps.objects.create(competition=competition, title='5 km')
+        for number, (club, position) in enumerate(((red, 1), (blue, 2), (blue, 3), (red, 5), (None, 4)), start=1):
+            Participant.objects.create(user=make_account(number, sport_club=club), competition=competition,
+                                       choice=choice, position=position, duration=time(0, 20, position))
+        self.assertEqual(compute_standings(choice.id), 2)
+        standings = TeamStanding.objects.filter(choice=choice, kind='club').order_by('rank')
+        self.assertEqual([(row.sport_club_id, row.score) for row in standings], [(blue.id, 5), (red.id, 6)])
+
+
+@override_settings(RATING_BASE_POINTS=100)
+class RatingTest(TestCase):
+    def test_rate_athletes(self):
+        first, second = make_account(1), make_account(2)
+        competition = Competition.objects.create(title='Autumn run', status='past')
+        choice = CompetitionMaps.objects.create(competition=competition, title='10 km')
+        Participant.objects.create(user=first, competition=competition, choice=choice, position=1)
+        Participant.objects.create(user=second, competition=competition, choice=choice, position=2)
+
+        self.assertEqual(rate_athletes(), (1, 2))
+        ratings = AthleteRating.objects.order_by('rank')
+        self.assertEqual([(row.user_id, row.rank, row.points, row.races) for row in ratings],
+                         [(first.id, 1, 100, 1), (second.id, 2, 50, 1)])
+        # incremental runs skip competitions that were already rated
+        self.assertEqual(rate_athletes(incremental=True), (0, 0))
+        self.assertEqual(AthleteRating.objects.get(user=first).points, 100)
+
+
+class ParticipantImportTest(TestCase):
+    def test_time_out_of_range_is_a_row_error(self):
+        competition = Competition.objects.create(title='Night run', status='past')
+        choice = CompetitionMaps.objects.create(competition=competition, title='10 km')
+        participant = Participant.objects.create(user=make_account(1), competition=competition, choice=choice)
+        resource = ParticipantResource()
+        headers = [field.column_name for field in resource.get_export_fields()]
+        row = ['7', '', '1', '10 km', '1e20', '', '', '', '', '', '', '', participant.id, '']
+        result = Result()
+
+        resource.after_import(tablib.Dataset(row, headers=headers), result, False, False)
+        self.assertEqual([invalid.number for invalid in result.invalid_rows], [1])
+        self.assertIn('time', result.invalid_rows[0].error_dict)
+        participant.refresh_from_db()
+        self.assertIsNone(participant.position)
+
+
+class RosterImportTest(TestCase):
+    def test_import_refreshes_the_home_page(self):
+        competition = Competition.objects.create(title='Club run', status='now', members=10)
+        choice = CompetitionMaps.objects.create(competition=competition, title='10 km')
+        roster = SimpleUploadedFile('roster.csv', b'phone,name,surname\n+998901112233,Aziz,Karimov\n')
+        tokens = section_tokens(['present'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_roster(roster, None, choice)
+        self.assertEqual((report['created'], report['enrolled']), (1, 1))
+        self.assertNotEqual(section_tokens(['present']), tokens)
+
+    def test_dry_run_leaves_the_home_page(self):
+        competition = Competition.objects.create(title='Club run', status='now', members=10)
+        choice = CompetitionMaps.objects.create(competition=competition, title='10 km')
+        roster = SimpleUploadedFile('roster.csv', b'phone,name,surname\n+998901112233,Aziz,Karimov\n')
+        tokens = section_tokens(['present'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_roster(roster, None, choice, dry_run=True)
+        self.assertEqual(section_tokens(['present']), tokens)
+        self.assertFalse(Participant.objects.exists())
+
+
+class CategorySvgTest(TestCase):
+    def test_competition_rows_link_the_svg(self):
+        category = Category.objects.create(title='Trail', svg='<svg xmlns="http://www.w3.org/2000/svg"/>')
+        Competition.objects.create(title='Mountain run', status='future', category=category)
+
+        row = self.client.get('/competition/api/v1/competitions/future/').json()
+        row = (row['results'] if isinstance(row, dict) else row)[0]
+        self.assertNotIn('svg', row['category'])
+        self.assertTrue(row['category']['svg_url'].endswith(f'/{category.svg_hash}.svg'))
+        svg = self.client.get(row['category']['svg_url'])
+        self.assertEqual(svg.content, category.svg.encode())
+        self.assertIn('immutable', svg['Cache-Control'])
+
+        categories = self.client.get('/competition/api/v1/category/').json()
+        self.assertEqual(categories[0]['svg'], category.svg)
+
+
+class ImageCleanupTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # background jobs run right away
+        patcher = mock.patch('apps.competition.signals.run_in_background', lambda func, *args: func(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_replaced_and_deleted_maps_leave_no_variants(self):
+        choice = CompetitionMaps.objects.create(title='10 km', maps=png('course.png', (600, 400)))
+        choice.refresh_from_db()
+        self.assertIn('tiles', choice.maps_variants)
+        first = derived_files(self.media)
+        self.assertIn(f'{choice.maps_variants["tiles"]["tiles"]}/0/0_0.webp', first)
+
+        choice.maps = png('course.png', (300, 200))
+        choice.save()
+        second = derived_files(self.media)
+        self.assertTrue(second)
+        self.assertFalse(first & second)
+        self.assertNotIn('tiles/course.png_files', ' '.join(second))
+
+        # deferred fields are read before the row goes
+        CompetitionMaps.objects.only('id').get(pk=choice.pk).delete()
+        self.assertEqual(derived_files(self.media), set())
@@ -0,0 +1,21 @@
+import django_filters
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Q
+from apps.main.models import News, NEWS_SEARCH_VECTOR
+
+
+class NewsFilter(django_filters.rest_framework.FilterSet):
+    category = django_filters.NumberFilter(field_name="category_id", lookup_expr='exact')
+    search = django_filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = News
+        fields = ('category', 'search')
+
+    def filter_search(self, queryset, name, value):
+        # full text through the GIN index on postgres, a plain scan elsewhere (sqlite in development)
+        if connection.vendor == 'postgresql':
+            return queryset.annotate(search=NEWS_SEARCH_VECTOR).filter(
+                search=SearchQuery(value, config='simple', search_type='websearch'))
+        return queryset.filter(Q(title__icontains=value) | Q(description__icontains=value))
@@ -16,6 +16,15 @@ class NewsDefaultSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'category', 'image', 'created_at')
 
 
+class NewsListSerializer(serializers.ModelSerializer):
+    category = BlogCategorySerializer(many=False)
+    teaser = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = News
+        fields = ('id', 'title', 'image', 'category', 'teaser', 'created_at')
+
+
 class NewsSerializer(serializers.ModelSerializer):
     category = BlogCategorySerializer(many=False)
 
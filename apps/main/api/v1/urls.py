@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import NewsDefaultBannerListView, NewsRetrieveAPIView, NewsListView, PartnerListView
+from .views import NewsDefaultBannerListView, NewsRetrieveAPIView, NewsListView, PartnerListView, ReferenceBundleView, \
+    HomeView
 
 urlpatterns = [
     path('banner/', NewsDefaultBannerListView.as_view()),
@@ -7,4 +8,6 @@ urlpatterns = [
     path('news/<int:pk>/', NewsRetrieveAPIView.as_view()),
 
     path('partners/', PartnerListView.as_view()),
+    path('bundle/', ReferenceBundleView.as_view()),
+    path('home/', HomeView.as_view()),
 ]
@@ -1,21 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Substr
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from apps.main.api.v1.serializers import NewsDefaultSerializer, NewsSerializer, PartnerSerializer
+from apps.main.api.v1.filters import NewsFilter
+from apps.main.api.v1.serializers import NewsDefaultSerializer, NewsSerializer, PartnerSerializer, NewsListSerializer
+from apps.main.bundle import bundles
+from apps.main.home import compress, parse_known, render_home
+from apps.main.news import page_cache_key
 from apps.main.models import News, Partner
 
 
-class NewsDefaultBannerListView(generics.ListAPIView):
-    queryset = News.objects.all()
+class NewsPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = settings.NEWS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CachedFirstPageMixin:
+    # the page without a cursor (and without a search) is what almost every client asks for
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        cacheable = not request.query_params.get('cursor') and not request.query_params.get('search')
+        if cacheable:
+            key = page_cache_key(request, self.cache_name)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if cacheable:
+            cache.set(key, response.data, settings.NEWS_CACHE_TTL)
+        return response
+
+
+class NewsDefaultBannerListView(CachedFirstPageMixin, generics.ListAPIView):
+    queryset = News.objects.select_related('category').defer('description').order_by('-created_at', '-id')
     serializer_class = NewsDefaultSerializer
+    cache_name = 'banner'
 
+    def get_queryset(self):
+        return super().get_queryset()[:settings.NEWS_BANNER_SIZE]
 
-class NewsListView(generics.ListAPIView):
-    queryset = News.objects.all()
-    serializer_class = NewsSerializer
+
+class NewsListView(CachedFirstPageMixin, generics.ListAPIView):
+    # ?category=<id>&search=<text>&cursor=...; teasers only, the body comes from the detail view
+    queryset = News.objects.select_related('category').defer('description').annotate(
+        teaser=Substr('description', 1, settings.NEWS_TEASER_LENGTH))
+    serializer_class = NewsListSerializer
+    pagination_class = NewsPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = NewsFilter
+    cache_name = 'feed'
 
 
 class NewsRetrieveAPIView(generics.RetrieveAPIView):
-    queryset = News.objects.all()
+    queryset = News.objects.select_related('category')
     serializer_class = NewsSerializer
     lookup_field = 'pk'
 
@@ -23,3 +70,46 @@ class NewsRetrieveAPIView(generics.RetrieveAPIView):
 class PartnerListView(generics.ListAPIView):
     queryset = Partner.objects.filter(competition_partners=None)
     serializer_class = PartnerSerializer
+
+
+class ReferenceBundleView(APIView):
+    # countries, cities, sport clubs and categories in one precompressed body;
+    # ?since=<version> answers 304 when nothing changed, otherwise only the changed sections
+    def get(self, request):
+        bundle = bundles.get(request)
+        since = request.query_params.get('since')
+        etag = f'"{bundle.version}"'
+        if since == bundle.version or request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=304)
+        else:
+            body, compressed = (bundle.delta(since) if since else None) or bundle.full
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+                response = HttpResponse(compressed, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        patch_cache_control(response, public=True, max_age=settings.BUNDLE_CACHE_MAX_AGE)
+        return response
+
+
+class HomeView(APIView):
+    # categories, present and future competitions, banner and partners in one gzipped payload;
+    # ?known=<section>:<version>,... leaves out the data of sections the client already has
+    def get(self, request):
+        known = parse_known(request.query_params.get('known'))
+        etag, body = render_home(request, known)
+        etag = f'"{etag}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=304)
+        elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(compress(request, etag, body, cacheable=not known),
+                                    content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
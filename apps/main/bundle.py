@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.account.api.v1.reference import reference_index
+from apps.account.api.v1.serializers import SportClubSerializer
+from apps.account.models import SportClub
+from apps.competition.api.v1.serializers import CategoryDetailSerializer
+from apps.competition.models import Category
+
+VERSION_KEY = 'bundle:version'
+SECTIONS_KEY = 'bundle:sections:{}'
+# how long the section hashes of a version stay known for ?since= deltas
+HISTORY_TTL = 60 * 60 * 24 * 30
+MAX_DELTAS = 32
+# site roots (Host headers) a worker keeps bundles for; media URLs are absolute, so each root has its own
+MAX_SITES = 4
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+
+def _digest(payload):
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def _sections(request):
+    reference_index.sync()
+    context = {'request': request}
+    return {
+        'countries': reference_index.countries.rows,
+        'cities': reference_index.cities.rows,
+        'sport_clubs': SportClubSerializer(SportClub.objects.order_by('name'), many=True, context=context).data,
+        'categories': CategoryDetailSerializer(Category.objects.filter(is_active=True).order_by('id'), many=True,
+                                               context=context).data,
+    }
+
+
+class Bundle:
+    """ One built version: per-section JSON fragments and hashes, the full body and its gzip """
+
+    def __init__(self, sections):
+        self.fragments = {name: _dumps(rows) for name, rows in sections.items()}
+        self.hashes = {name: _digest(fragment) for name, fragment in self.fragments.items()}
+        self.version = _digest(_dumps(self.hashes))
+        self.full = self.encode(self.fragments)
+        self.deltas = {}
+        self.lock = threading.Lock()
+
+    def encode(self, names, delta=False):
+        # fragments are spliced in as already-serialized JSON
+        parts = [b'"%s":{"hash":"%s","data":%s}' % (name.encode(), self.hashes[name].encode(), self.fragments[name])
+                 for name in names]
+        body = b'{"version":"%s","delta":%s,"sections":{%s}}' % (
+            self.version.encode(), b'true' if delta else b'false', b','.join(parts))
+        return body, gzip.compress(body, 6)
+
+    def delta(self, since):
+        """ (body, gzip) of the sections that changed since `since`, None if that version is unknown """
+        with self.lock:
+            if since in self.deltas:
+                return self.deltas[since]
+        hashes = cache.get(SECTIONS_KEY.format(since))
+        if hashes is None:
+            return None
+        changed = [name for name in self.fragments if hashes.get(name) != self.hashes[name]]
+        encoded = self.encode(changed, delta=True)
+        with self.lock:
+            if len(self.deltas) >= MAX_DELTAS:
+                self.deltas.clear()
+            self.deltas[since] = encoded
+        return encoded
+
+
+class BundleCache:
+    """
+    Per-worker built bundles keyed by (source versions, site root). Country and
+    city changes move the reference index version, club and category changes
+    the bundle token (apps.main.signals); either makes the next request rebuild.
+    Only the MAX_SITES most recently used site roots are kept, any Host header
+    would otherwise add a full bundle.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bundles = OrderedDict()
+
+    def get(self, request):
+        token = cache.get(VERSION_KEY)
+        if token is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            token = cache.get(VERSION_KEY)
+        key = (reference_index.sync(), token, request.build_absolute_uri('/'))
+        with self.lock:
+            bundle = self.bundles.get(key)
+            if bundle is not None:
+                self.bundles.move_to_end(key)
+                return bundle
+            bundle = Bundle(_sections(request))
+            cache.set(SECTIONS_KEY.format(bundle.version), bundle.hashes, timeout=HISTORY_TTL)
+            # only the current sources are ever served
+            self.bundles = OrderedDict((k, v) for k, v in self.bundles.items() if k[:2] == key[:2])
+            self.bundles[key] = bundle
+            while len(self.bundles) > MAX_SITES:
+                self.bundles.popitem(last=False)
+        return bundle
+
+
+bundles = BundleCache()
+
+
+def touch_bundle():
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None))
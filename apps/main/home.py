@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from rest_framework import serializers
+
+from apps.competition.api.v1.serializers import BannerImagesSerializer, CategoryDetailSerializer, \
+    FutureCompetitionSerializer
+from apps.competition.models import Category, Competition, CompetitionMaps, Participant
+from apps.main.api.v1.serializers import NewsDefaultSerializer, PartnerSerializer
+from apps.main.models import News, Partner
+
+SECTIONS = ('categories', 'present', 'future', 'banner', 'partners')
+TOKEN_KEY = 'home:token:{}'
+SECTION_KEY = 'home:section:{}:{}:{}'
+
+
+class HomeFutureCompetitionSerializer(FutureCompetitionSerializer):
+    # same payload, the last distance comes from a subquery instead of one query per competition
+    last_distance = serializers.CharField(read_only=True)
+
+
+def _categories():
+    return CategoryDetailSerializer, Category.objects.order_by('id')
+
+
+def _present():
+    participants = Participant.objects.select_related('user') \
+        .only('id', 'competition_id', 'user', 'user__avatar', 'user__avatar_variants')
+    return BannerImagesSerializer, Competition.objects.filter(status='now').select_related('category') \
+        .defer('category__svg').prefetch_related(Prefetch('competition_participants', queryset=participants)) \
+        .order_by('-id')
+
+
+def _future():
+    last_distance = CompetitionMaps.objects.filter(competition=OuterRef('pk')).order_by('-pk').values('title')[:1]
+    return HomeFutureCompetitionSerializer, Competition.objects.filter(status='future').select_related('category') \
+        .defer('category__svg').annotate(last_distance=Subquery(last_distance)).order_by('-id')
+
+
+def _banner():
+    return NewsDefaultSerializer, News.objects.select_related('category').defer('description') \
+        .order_by('-created_at', '-id')[:settings.NEWS_BANNER_SIZE]
+
+
+def _partners():
+    return PartnerSerializer, Partner.objects.filter(competition_partners=None)
+
+
+BUILDERS = {
+    'categories': _categories,
+    'present': _present,
+    'future': _future,
+    'banner': _banner,
+    'partners': _partners,
+}
+
+
+def section_tokens(names):
+    tokens = cache.get_many([TOKEN_KEY.format(name) for name in names])
+    missing = {TOKEN_KEY.format(name): uuid.uuid4().hex for name in names if TOKEN_KEY.format(name) not in tokens}
+    if missing:
+        for key, token in missing.items():
+            cache.add(key, token, timeout=None)
+        tokens.update(cache.get_many(list(missing)))
+    return {name: tokens[TOKEN_KEY.format(name)] for name in names}
+
+
+def touch_sections(*names):
+    """ Rebuild the named sections on their next request, once the current transaction commits """
+    def touch():
+        cache.set_many({TOKEN_KEY.format(name): uuid.uuid4().hex for name in names}, timeout=None)
+    transaction.on_commit(touch)
+
+
+def get_sections(request, names=SECTIONS):
+    """
+    {name: (version, JSON fragment)}. Two cache round trips when warm; a section
+    is built at most once per token and site root, with batched queries.
+    """
+    root = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()
+    keys = {name: SECTION_KEY.format(name, token, root) for name, token in section_tokens(names).items()}
+    cached = cache.get_many(list(keys.values()))
+    sections, built = {}, {}
+    for name, key in keys.items():
+        section = cached.get(key)
+        if section is None:
+            serializer_class, queryset = BUILDERS[name]()
+            fragment = json.dumps(serializer_class(queryset, many=True, context={'request': request}).data,
+                                  separators=(',', ':'), ensure_ascii=False, default=str).encode()
+            section = built[key] = (hashlib.sha256(fragment).hexdigest()[:16], fragment)
+        sections[name] = section
+    if built:
+        cache.set_many(built, settings.HOME_CACHE_TTL)
+    return sections
+
+
+def parse_known(value):
+    """ 'present:3f2a..,future:9c1b..' -> {'present': '3f2a..', 'future': '9c1b..'} """
+    known = {}
+    for item in (value or '').split(','):
+        name, _, version = item.partition(':')
+        if name in BUILDERS and version:
+            known[name] = version
+    return known
+
+
+def render_home(request, known):
+    """ Body of the home payload; sections the client already has at this version come without data """
+    sections = get_sections(request)
+    parts = []
+    for name, (version, fragment) in sections.items():
+        if known.get(name) == version:
+            parts.append(b'"%s":{"version":"%s","unchanged":true}' % (name.encode(), version.encode()))
+        else:
+            parts.append(b'"%s":{"version":"%s","data":%s}' % (name.encode(), version.encode(), fragment))
+    etag = hashlib.sha256(b''.join(version.encode() for version, _ in sections.values())).hexdigest()[:16]
+    return etag, b'{"sections":{%s}}' % b','.join(parts)
+
+
+def compress(request, etag, body, cacheable):
+    """ gzip of the body; the full payload (no known sections) is compressed once per version and site root """
+    if not cacheable:
+        return gzip.compress(body, 6)
+    key = f'home:gzip:{etag}:{hashlib.md5(request.build_absolute_uri("/").encode()).hexdigest()}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = gzip.compress(body, 6)
+        cache.set(key, compressed, settings.HOME_CACHE_TTL)
+    return compressed
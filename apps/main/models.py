@@ -1,7 +1,8 @@
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from django.utils.safestring import mark_safe
 
-from apps.base.models import BaseModel
+from apps.base.models import BaseModel, PostgresGinIndex
 
 
 class BlogCategory(BaseModel):
@@ -15,10 +16,19 @@ class BlogCategory(BaseModel):
         return self.title
 
 
+# the news search expression; on postgres a GIN index over exactly this expression serves the queries
+NEWS_SEARCH_VECTOR = SearchVector('title', 'description', config='simple')
+
+
 class News(models.Model):
     class Meta:
         verbose_name = "Newses"
         verbose_name_plural = "News"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='news_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='news_category_created_idx'),
+            PostgresGinIndex(NEWS_SEARCH_VECTOR, name='news_search_idx'),
+        ]
 
     title = models.CharField(max_length=223, null=True, blank=True)
     category = models.ForeignKey(BlogCategory, on_delete=models.CASCADE, null=True, blank=True, related_name="category")
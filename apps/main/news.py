@@ -0,0 +1,26 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'news:version'
+
+
+def news_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def touch_news():
+    """ Drop every cached news page once the current transaction commits """
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def page_cache_key(request, name):
+    # the absolute URI keeps host, filters and page size apart
+    uri = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'news:{name}:{news_version()}:{uri}'
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.account.models import SportClub
+from apps.competition.models import Category, Competition, CompetitionMaps, Participant
+from apps.main.bundle import touch_bundle
+from apps.main.home import touch_sections
+from apps.main.models import BlogCategory, News, Partner
+from apps.main.news import touch_news
+
+
+@receiver(post_save, sender=SportClub)
+@receiver(post_delete, sender=SportClub)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_bundle(sender, **kwargs):
+    touch_bundle()
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def refresh_news(sender, **kwargs):
+    touch_news()
+
+
+HOME_SECTIONS = {
+    Category: ('categories', 'present', 'future'),
+    Competition: ('present', 'future'),
+    CompetitionMaps: ('future',),
+    Participant: ('present',),
+    News: ('banner',),
+    BlogCategory: ('banner',),
+    Partner: ('partners',),
+}
+
+
+def refresh_home(sender, **kwargs):
+    touch_sections(*HOME_SECTIONS[sender])
+
+
+for model in HOME_SECTIONS:
+    post_save.connect(refresh_home, sender=model, dispatch_uid=f'home_{model.__name__}_save')
+    post_delete.connect(refresh_home, sender=model, dispatch_uid=f'home_{model.__name__}_delete')
+
+
+@receiver(m2m_changed, sender=Competition.partners.through)
+def refresh_home_partners(sender, **kwargs):
+    touch_sections('partners')
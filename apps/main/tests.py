@@ -1,3 +1,22 @@
 from django.test import TestCase
 
-# Create your tests here.
+from apps.main.bundle import MAX_SITES, bundles
+
+
+class BundleCacheTest(TestCase):
+    def setUp(self):
+        bundles.bundles.clear()
+
+    def test_bundles_per_host_are_bounded(self):
+        for number in range(MAX_SITES + 3):
+            response = self.client.get('/content/api/v1/bundle/', HTTP_HOST=f'host{number}.example.com')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(bundles.bundles), MAX_SITES)
+        # the most recent hosts are the ones kept
+        self.assertEqual([key[2] for key in bundles.bundles][-1], f'http://host{MAX_SITES + 2}.example.com/')
+
+    def test_repeat_requests_reuse_the_bundle(self):
+        self.client.get('/content/api/v1/bundle/')
+        bundle = next(iter(bundles.bundles.values()))
+        self.client.get('/content/api/v1/bundle/')
+        self.assertIs(next(iter(bundles.bundles.values())), bundle)
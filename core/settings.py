@@ -80,13 +80,25 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         # 'rest_framework.permissions.IsAuthenticated',
     ],
+    # no password-hashing authenticators (Basic) on the API: a request costs a JWT signature check,
+    # the account comes from a short-lived per-worker cache
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',  # enables simple command line authentication
+        'apps.account.api.v1.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ),
+    # token buckets of apps.account.api.v1.throttles, '<view.throttle_scope>_<ip|phone>': 'tokens/period'
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_phone': '5/min',
+        'register_ip': '10/hour',
+        'register_phone': '3/hour',
+        'verify_ip': '30/min',
+        'verify_phone': '10/hour',
+        'sms_ip': '10/hour',
+        'sms_phone': '3/hour',
+        'password_ip': '20/hour',
+        'password_phone': '5/hour',
+    },
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 10
 }
@@ -128,6 +140,27 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# shared by every worker: revoked tokens, throttle buckets and the version keys of cached responses live here.
+# Redis when REDIS_URL is set, otherwise a database table (python manage.py createcachetable)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+            # the default of 300 rows would cull live entries on every busy minute
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
 # <=============================================== PostgresSQL ========================================================>
 # DATABASES = {
 #     'default': {
@@ -224,14 +257,67 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "apps.account.api.v1.tokens.VersionedTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "apps.account.api.v1.tokens.FilteredTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
-    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "apps.account.api.v1.tokens.FilteredTokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+# seconds an authenticated account stays in the per-worker cache, and the max number of cached accounts
+JWT_USER_CACHE_TTL = 60
+JWT_USER_CACHE_SIZE = 10000
+# minimum size of the per-worker bloom filter of revoked token ids, and how long revocations stay in the
+# shared cache log for other workers to pick up (older gaps make a worker rebuild from the database)
+TOKEN_BLACKLIST_FILTER_CAPACITY = 100000
+TOKEN_BLACKLIST_LOG_TTL = 60 * 60
+# seconds a worker trusts its filter before looking for revocations made by other workers
+TOKEN_BLACKLIST_SYNC_INTERVAL = 2
+
+# threads per process for work deferred off the request path (apps.base.tasks)
+BACKGROUND_WORKERS = 4
+
+# format serializers link resized images in, webp or jpeg (both are stored)
+IMAGE_VARIANT_FORMAT = 'webp'
+
+# sms: 'eskiz' sends through notify.eskiz.uz with EMAIL/PASSWORD, 'stub' only logs (offline development)
+SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'eskiz')
+SMS_SENDER = '4546'
+SMS_CALLBACK_URL = os.getenv('SMS_CALLBACK_URL')
+SMS_WORKERS = 2
+# (connect, read) seconds
+SMS_TIMEOUT = (3.05, 10)
+# fallback lifetime of a provider token that carries no exp claim
+SMS_TOKEN_TTL = 60 * 60 * 24
+# broadcasts: recipients per send-batch request and send-batch requests per second
+SMS_BATCH_SIZE = 200
+SMS_BATCH_RATE = 2
+
+# one-time codes: lifetime in seconds, wrong guesses allowed per code, seconds between purges of expired rows
+OTP_TTL = 5 * 60
+OTP_MAX_ATTEMPTS = 5
+OTP_PURGE_INTERVAL = 10 * 60
+
+# max-age of the country/city reference responses, they revalidate by ETag afterwards
+REFERENCE_CACHE_MAX_AGE = 60 * 60 * 24
+# max-age of content/bundle/, clients then probe it with ?since=<version>
+BUNDLE_CACHE_MAX_AGE = 60 * 5
+
+# news: feed page size, latest items in the banner, characters in a list teaser, seconds first pages stay cached
+NEWS_PAGE_SIZE = 20
+NEWS_BANNER_SIZE = 10
+NEWS_TEASER_LENGTH = 200
+NEWS_CACHE_TTL = 60 * 5
+# seconds a built content/home/ section stays cached (signals rebuild it earlier on changes)
+HOME_CACHE_TTL = 60 * 5
+
+# competition
+# number of best finishers summed into a club or country team score
+TEAM_SCORING_SIZE = 3
+# points for winning a 10 km race, scaled by field size and distance
+RATING_BASE_POINTS = 100
+
 JAZZMIN_SETTINGS = {
     # title of the window
     'site_title': 'Prorun Admin',
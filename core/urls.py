@@ -22,7 +22,9 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
+from rest_framework_simplejwt.views import TokenRefreshView, TokenBlacklistView
+
+from apps.account.api.v1.views import ThrottledTokenObtainPairView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -39,7 +41,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
 
-    path('token/api/access/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/api/access/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/api/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/api/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),
 